@@ -0,0 +1,1685 @@
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask_cors import CORS
+import firebase_admin
+from firebase_admin import credentials, firestore, auth, exceptions
+from google.api_core import exceptions as google_exceptions
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict, deque
+import base64
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+# Initialize Flask app
+app = Flask(__name__)
+
+# Enable CORS for all routes (for development, restrict in production)
+CORS(app)
+
+# --- Firebase Firestore & Auth Configuration ---
+# IMPORTANT: Replace 'path/to/your/serviceAccountKey.json' with the actual path
+# to your Firebase service account key file.
+# For production, consider using environment variables for the key content directly
+# instead of a file for better security.
+SERVICE_ACCOUNT_KEY_PATH = 'serviceAccountKey.json'
+
+# Global variables for Firestore DB and collections
+db = None
+users_collection = None
+tickets_collection = None
+db_connected = False # Flag to track database connection status
+
+# --- Auth cache settings ---
+# Per-process caches for user profiles (keyed by uid) and verified ID tokens
+USER_PROFILE_CACHE_SIZE = int(os.environ.get('USER_PROFILE_CACHE_SIZE', '1024'))
+USER_PROFILE_CACHE_TTL = int(os.environ.get('USER_PROFILE_CACHE_TTL', '300')) # seconds
+ID_TOKEN_CACHE_SIZE = int(os.environ.get('ID_TOKEN_CACHE_SIZE', '4096'))
+ID_TOKEN_CACHE_TTL = int(os.environ.get('ID_TOKEN_CACHE_TTL', '600')) # seconds, capped by the token's 'exp'
+
+# --- Dashboard counter settings ---
+# Ticket counts are kept in NUM_COUNTER_SHARDS documents ('counters/ticket_stats_<n>')
+# so concurrent ticket writes rarely touch the same counter document.
+NUM_COUNTER_SHARDS = 10
+# Seconds between background reconciliation runs (0 disables the background job).
+# Every process runs the job, but a run is skipped if any process reconciled recently.
+COUNTER_RECONCILE_INTERVAL = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', '3600'))
+# How long one reconciliation run may hold the lease before another process may take over
+COUNTER_RECONCILE_LEASE_SECONDS = 600
+# Statuses that never count as overdue
+FINAL_STATUSES = ['Resolved', 'Closed']
+# Every status the web, React and Node clients can set on a ticket
+TICKET_STATUSES = ['Open', 'In Progress', 'InProgress', 'Hold', 'On Hold', 'Waiting reply', 'Resolved', 'Closed']
+# Counter key used for a ticket with no status (Firestore rejects empty field names)
+UNKNOWN_COUNTER_KEY = 'Unknown'
+
+# --- Ticket display ID allocation settings ---
+# Number of display IDs each process reserves per counter transaction
+TICKET_ID_BLOCK_SIZE = int(os.environ.get('TICKET_ID_BLOCK_SIZE', '50'))
+
+# --- Bulk ticket update settings ---
+# Maximum number of tickets accepted by one /tickets/bulk_update request
+BULK_MAX_TICKETS = 5000
+# Tickets per commit; one write per ticket plus one counter shard write stays
+# within Firestore's 500-writes-per-commit limit
+BULK_CHUNK_SIZE = 499
+# Number of chunk commits running in parallel
+BULK_MAX_PARALLEL_COMMITS = 4
+
+# --- Live ticket feed (Server-Sent Events) settings ---
+# Seconds between heartbeat comments on an idle stream
+SSE_HEARTBEAT_SECONDS = 15
+# Events each client may have waiting before it is disconnected as too slow
+SSE_CLIENT_QUEUE_SIZE = 1000
+# Recent events kept per feed so reconnecting clients can resume via Last-Event-ID
+SSE_REPLAY_BUFFER_SIZE = 5000
+# Seconds a feed keeps its listener (and replay buffer) after its last client
+# disconnects, so reconnecting clients resume instead of reloading
+SSE_FEED_IDLE_SECONDS = 60
+# Most feeds (Firestore listeners) one process keeps open, idle ones included
+SSE_MAX_FEEDS = 100
+# Assignment filters a live feed can express as a Firestore query
+SSE_ASSIGNMENT_FILTERS = ('unassigned', 'assigned_to_me')
+
+# --- Request instrumentation settings ---
+# Requests slower than this many seconds are logged with their Firestore usage
+# and query shapes (0 disables the slow-request log)
+SLOW_REQUEST_LOG_SECONDS = float(os.environ.get('SLOW_REQUEST_LOG_SECONDS', '0'))
+
+# --- Ticket list pagination settings ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fields rendered by the ticket list table. List views only fetch these, so the
+# (potentially large) 'comments' array is never read for a list page.
+TICKET_LIST_FIELDS = [
+    'display_id',
+    'title',
+    'reporter',
+    'status',
+    'priority',
+    'creator_uid',
+    'creator_email',
+    'assigned_to_email',
+    'created_at',
+    'updated_at',
+    'comment_count',
+    'last_replier',
+]
+
+# --- Ticket export settings ---
+# Tickets read from Firestore per page while streaming an export
+EXPORT_PAGE_SIZE = 500
+# Columns written by /tickets/export, in order ('id' is the Firestore document ID)
+EXPORT_FIELDS = [
+    'id',
+    'display_id',
+    'title',
+    'description',
+    'status',
+    'priority',
+    'reporter',
+    'creator_email',
+    'assigned_to_email',
+    'comment_count',
+    'last_replier',
+    'created_at',
+    'updated_at',
+    'due_date',
+]
+
+try:
+    # Initialize Firebase Admin SDK only once
+    if not firebase_admin._apps: # Check if Firebase app is already initialized
+        cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
+        firebase_admin.initialize_app(cred)
+    db = metrics.instrument_firestore(firestore.client()) # Get a Firestore client (counts reads/writes for /metrics)
+    users_collection = db.collection('users') # Collection for user roles
+    tickets_collection = db.collection('tickets') # Reference to your 'tickets' collection
+    print("Connected to Firebase Firestore successfully!")
+    db_connected = True
+except Exception as e:
+    print(f"Error connecting to Firebase Firestore. Make sure 'serviceAccountKey.json' is correct and accessible: {e}")
+    db_connected = False
+
+# Helper function to convert Firestore document to a JSON-serializable dictionary
+def json_serializable_ticket(doc_id, ticket_data):
+    """
+    Helper function to convert Firestore document data (including datetime objects)
+    into a JSON-serializable dictionary.
+    Adds the document ID as 'id'.
+    """
+    if ticket_data:
+        ticket_data['id'] = doc_id
+        # Convert Firestore Timestamp objects to ISO 8601 strings
+        if 'created_at' in ticket_data and isinstance(ticket_data['created_at'], datetime):
+            ticket_data['created_at'] = ticket_data['created_at'].isoformat()
+        if 'updated_at' in ticket_data and isinstance(ticket_data['updated_at'], datetime):
+            ticket_data['updated_at'] = ticket_data['updated_at'].isoformat()
+        if 'due_date' in ticket_data and isinstance(ticket_data['due_date'], datetime):
+            ticket_data['due_date'] = ticket_data['due_date'].isoformat()
+        if 'comments' in ticket_data and isinstance(ticket_data['comments'], list):
+            for comment in ticket_data['comments']:
+                if 'timestamp' in comment and isinstance(comment['timestamp'], datetime):
+                    comment['timestamp'] = comment['timestamp'].isoformat()
+    return ticket_data
+
+# Helper function to convert a Firestore comment document to a JSON-serializable dictionary
+def json_serializable_comment(doc_id, comment_data):
+    """
+    Converts a document from a ticket's 'comments' subcollection into a
+    JSON-serializable dictionary. Adds the document ID as 'id'.
+    """
+    if comment_data:
+        comment_data['id'] = doc_id
+        if 'timestamp' in comment_data and isinstance(comment_data['timestamp'], datetime):
+            comment_data['timestamp'] = comment_data['timestamp'].isoformat()
+    return comment_data
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+    Keeps hit/miss/eviction counters so the cache can be sized from /cache/stats.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, expires_at=None):
+        """
+        Stores value under key until the TTL elapses, or until expires_at
+        (a Unix timestamp) if that comes first.
+        """
+        ttl_expiry = time.time() + self.ttl
+        expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+user_profile_cache = TTLCache(USER_PROFILE_CACHE_SIZE, USER_PROFILE_CACHE_TTL)
+id_token_cache = TTLCache(ID_TOKEN_CACHE_SIZE, ID_TOKEN_CACHE_TTL)
+
+def verify_id_token_cached(id_token):
+    """
+    Verifies a Firebase ID token, reusing the decoded token if this process has
+    already verified it. Entries are keyed by a hash of the token and never
+    outlive the token's 'exp' claim.
+    """
+    token_hash = hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+    decoded_token = id_token_cache.get(token_hash)
+    if decoded_token is None:
+        decoded_token = auth.verify_id_token(id_token)
+        id_token_cache.set(token_hash, decoded_token, expires_at=decoded_token.get('exp'))
+    return decoded_token
+
+def get_user_profile(uid):
+    """
+    Returns the Firestore user profile (email, role) for uid, or None if there
+    is no profile. Profiles are cached per process; call
+    invalidate_user_profile() whenever a profile or role is written.
+    """
+    user_profile = user_profile_cache.get(uid)
+    if user_profile is None:
+        user_doc = users_collection.document(uid).get()
+        if not user_doc.exists:
+            return None
+        user_profile = user_doc.to_dict()
+        user_profile_cache.set(uid, user_profile)
+    return dict(user_profile)
+
+def invalidate_user_profile(uid):
+    """
+    Drops the cached profile for uid so the next lookup reads Firestore.
+    """
+    user_profile_cache.invalidate(uid)
+
+@app.route('/register', methods=['POST'])
+def register():
+    """
+    API endpoint for user registration using Firebase Authentication.
+    Creates user in Firebase Auth and stores user role in Firestore.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    data = request.get_json()
+    email = data.get('email')
+    password = data.get('password')
+    role = data.get('role', 'user') # Default role is 'user'
+
+    if not email or not password:
+        return jsonify({"error": "Email and password are required!"}), 400
+
+    if role not in ['user', 'support']:
+        return jsonify({"error": "Invalid role specified."}), 400
+
+    try:
+        # Create user in Firebase Authentication
+        user = auth.create_user(email=email, password=password)
+        print(f"Firebase Auth user created: {user.uid}")
+
+        # Store user role in Firestore (using UID as document ID)
+        users_collection.document(user.uid).set({'email': email, 'role': role})
+        invalidate_user_profile(user.uid)
+        print(f"Firestore user profile created for {user.uid} with role {role}")
+
+        return jsonify({"message": f"User {email} registered successfully!", "user_id": user.uid}), 201
+    except firebase_admin.auth.EmailAlreadyExistsError:
+        return jsonify({"error": "Email already registered."}), 409
+    except Exception as e:
+        print(f"Registration error: {e}")
+        return jsonify({"error": f"Error registering user: {e}"}), 500
+
+@app.route('/login', methods=['POST'])
+def login():
+    """
+    API endpoint for user login verification.
+    Expects a Firebase ID Token from the client-side in the Authorization header.
+    Verifies the token and retrieves the user's role from Firestore.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    # Get the ID token from the Authorization header
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return jsonify({"error": "Authorization header with Bearer token is required!"}), 401
+
+    id_token = auth_header.split(' ')[1]
+
+    try:
+        # Verify the ID token using Firebase Admin SDK
+        # This checks if the token is valid, not expired, and issued by your Firebase project
+        # Tokens this process has already verified are served from id_token_cache
+        decoded_token = verify_id_token_cached(id_token)
+        uid = decoded_token['uid']
+        email_from_token = decoded_token.get('email', '')
+
+        print(f"ID Token verified for UID: {uid}, Email: {email_from_token}")
+
+        # Retrieve user role from Firestore (or the per-process profile cache)
+        user_profile = get_user_profile(uid)
+
+        if user_profile is None:
+            # This case should ideally not happen if registration always creates a Firestore profile
+            # but good for robustness.
+            print(f"User profile for UID {uid} not found in Firestore.")
+            return jsonify({"error": "User profile not found in database. Please contact support."}), 404
+
+        logged_in_user = {
+            'id': uid,
+            'email': email_from_token,
+            'role': user_profile.get('role', 'user')
+        }
+        print(f"Login successful for user: {logged_in_user}")
+        return jsonify({"message": "Login successful", "user": logged_in_user}), 200
+    except firebase_admin.auth.InvalidIdTokenError as e:
+        print(f"Invalid ID Token error: {e}")
+        return jsonify({"error": "Invalid or expired authentication token. Please log in again."}), 401
+    except firebase_admin.exceptions.FirebaseError as e:
+        # Catch other Firebase Admin SDK errors
+        print(f"Firebase Admin SDK error during login: {e}")
+        return jsonify({"error": f"Authentication error: {e.code}"}), 401
+    except Exception as e:
+        print(f"Unexpected login error: {e}")
+        return jsonify({"error": f"An unexpected error occurred during login: {e}"}), 500
+
+# --- Request instrumentation ---
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+@app.before_request
+def start_background_jobs():
+    ensure_counter_reconciliation()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Records the request's latency and logs it if it was slower than
+    SLOW_REQUEST_LOG_SECONDS. Firestore reads made while a streamed response
+    body is sent still count towards /metrics, but not towards this log line.
+    """
+    seconds, stats = metrics.finish_request(response)
+    if SLOW_REQUEST_LOG_SECONDS > 0 and seconds >= SLOW_REQUEST_LOG_SECONDS and stats is not None:
+        print(
+            f"Slow request: {request.method} {request.path} -> {response.status_code} in {seconds:.3f}s "
+            f"(reads={stats['reads']}, writes={stats['writes']}, transaction_retries={stats['transaction_retries']}, "
+            f"queries={stats['queries']})"
+        )
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    API endpoint exposing request latency histograms and Firestore read/write/retry
+    counters for this process in the Prometheus text format.
+    """
+    return Response(metrics.registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    API endpoint to get hit/miss counters of this process's auth caches.
+    """
+    return jsonify({
+        "user_profiles": user_profile_cache.stats(),
+        "id_tokens": id_token_cache.stats()
+    }), 200
+
+# Helper function to read a single document inside a transaction
+def get_snapshot_in_transaction(transaction, doc_ref):
+    """
+    Reads a document within a transaction and returns its DocumentSnapshot,
+    or None if nothing was returned.
+    """
+    # transaction.get() may return a DocumentSnapshot or a generator depending
+    # on the client library version. Handle both cases so we always end up with
+    # a single snapshot.
+    retrieved_obj = transaction.get(doc_ref)
+
+    # Check if the retrieved object is iterable (like a generator) and not a string/bytes
+    if hasattr(retrieved_obj, '__iter__') and not isinstance(retrieved_obj, (str, bytes)):
+        try:
+            # Get the first (and only) DocumentSnapshot from the generator
+            return next(retrieved_obj)
+        except StopIteration:
+            # Document does not exist yet
+            return None
+    # Already a DocumentSnapshot
+    return retrieved_obj
+
+# Helper functions for sequential 'ITXXXXXX' display IDs
+def format_ticket_display_id(number):
+    """
+    Formats a ticket number as a display ID with leading zeros (e.g., 1 -> IT000001).
+    """
+    formatted_number = str(number).zfill(6)
+    return f"IT{formatted_number}"
+
+def reserve_ticket_id_block(transaction, block_size):
+    """
+    Reserves a block of block_size ticket numbers within a transaction and
+    returns it as a (first, end) range, end exclusive. The block is taken from
+    the 'count' field of 'counters/ticket_id_counter' (the highest number
+    handed out so far).
+    """
+    counter_ref = db.collection('counters').document('ticket_id_counter')
+    counter_doc = get_snapshot_in_transaction(transaction, counter_ref)
+    current_count = counter_doc.get('count') if counter_doc and counter_doc.exists else 0
+
+    # Update the counter within the transaction
+    transaction.set(counter_ref, {'count': current_count + block_size})
+    return current_count + 1, current_count + block_size + 1
+
+class TicketIdAllocator:
+    """
+    Hands out 'ITXXXXXX' display IDs from blocks reserved in Firestore (hi/lo).
+    One counter transaction reserves block_size numbers, which are then issued
+    from memory, so the hot counter document is touched once per block instead
+    of once per ticket. Numbers left in a block when the process exits are
+    never issued, so display IDs stay unique but may have gaps.
+    """
+
+    def __init__(self, block_size=1):
+        self.block_size = block_size
+        self.blocks_reserved = 0
+        self._lock = threading.Lock()
+        self._next_number = 0
+        self._end_number = 0
+
+    def reset(self):
+        """
+        Drops the current block. Called in forked children so two processes never
+        issue numbers from the same inherited block.
+        """
+        self._lock = threading.Lock()
+        self._next_number = 0
+        self._end_number = 0
+
+    def next_display_id(self):
+        """
+        Returns the next display ID, reserving a new block when the current one is used up.
+        """
+        with self._lock:
+            if self._next_number >= self._end_number:
+                transaction_obj = db.transaction()
+
+                @firestore.transactional
+                def reserve_block_transaction(transaction):
+                    return reserve_ticket_id_block(transaction, self.block_size)
+
+                self._next_number, self._end_number = reserve_block_transaction(transaction_obj)
+                self.blocks_reserved += 1
+            number = self._next_number
+            self._next_number += 1
+        return format_ticket_display_id(number)
+
+ticket_id_allocator = TicketIdAllocator(TICKET_ID_BLOCK_SIZE)
+# Worker servers (e.g. gunicorn --preload) fork after import; give each child a fresh block
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ticket_id_allocator.reset)
+
+# Helper functions for the sharded dashboard counters
+def ticket_counter_contribution(ticket_data, now=None):
+    """
+    Returns the counter fields a single ticket contributes to, as a dict of
+    counter key -> 1. Counter keys are tuples naming a (possibly nested) field
+    of a counter shard document; a missing status is counted under
+    UNKNOWN_COUNTER_KEY. A ticket past its due date (as of now) that is not in
+    a final status contributes to 'overdue'.
+    """
+    now = now or datetime.now(timezone.utc)
+    status = ticket_data.get('status')
+    contribution = {('total_tickets',): 1}
+    contribution[('by_status', str(status) if status else UNKNOWN_COUNTER_KEY)] = 1
+    assigned_to_email = ticket_data.get('assigned_to_email')
+    if assigned_to_email:
+        contribution[('assigned_tickets',)] = 1
+        contribution[('by_assignee', str(assigned_to_email))] = 1
+    else:
+        contribution[('unassigned',)] = 1
+    due_date = ticket_data.get('due_date')
+    if isinstance(due_date, datetime) and due_date < now and status not in FINAL_STATUSES:
+        contribution[('overdue',)] = 1
+    return contribution
+
+def ticket_counter_deltas(old_ticket_data, new_ticket_data):
+    """
+    Computes the counter changes for a ticket moving from old_ticket_data to
+    new_ticket_data. Either side may be None (ticket created / deleted).
+    """
+    deltas = {}
+    now = datetime.now(timezone.utc)
+    if old_ticket_data is not None:
+        for key, value in ticket_counter_contribution(old_ticket_data, now).items():
+            deltas[key] = deltas.get(key, 0) - value
+    if new_ticket_data is not None:
+        for key, value in ticket_counter_contribution(new_ticket_data, now).items():
+            deltas[key] = deltas.get(key, 0) + value
+    return {key: value for key, value in deltas.items() if value != 0}
+
+def nest_counter_fields(counter_values):
+    """
+    Converts a dict keyed by counter key tuples into the nested dict layout of a
+    counter shard document, e.g. {('by_status', 'Open'): 1} -> {'by_status': {'Open': 1}}.
+    """
+    nested = {}
+    for key, value in counter_values.items():
+        target = nested
+        for part in key[:-1]:
+            target = target.setdefault(part, {})
+        target[key[-1]] = value
+    return nested
+
+def counter_shard_ref(shard_index):
+    """
+    Returns the document reference of a dashboard counter shard.
+    """
+    return db.collection('counters').document(f'ticket_stats_{shard_index}')
+
+def apply_counter_deltas(transaction, deltas):
+    """
+    Writes counter deltas to a random counter shard as part of the given
+    transaction (or write batch), using server-side increments.
+    """
+    if not deltas:
+        return
+    shard_data = nest_counter_fields({key: firestore.Increment(value) for key, value in deltas.items()})
+    shard_ref = counter_shard_ref(random.randrange(NUM_COUNTER_SHARDS))
+    transaction.set(shard_ref, shard_data, merge=True)
+
+def counter_reconcile_status_ref():
+    """
+    Returns the document recording the last reconciliation and the lease that
+    keeps two reconciliation runs from overlapping.
+    """
+    return db.collection('counters').document('ticket_stats_reconcile')
+
+def read_ticket_counters():
+    """
+    Sums all counter shards into a single dict. Costs NUM_COUNTER_SHARDS + 1
+    document reads regardless of how many tickets exist.
+    'reconciled_at' is None if the counters have never been reconciled.
+    """
+    totals = {
+        'total_tickets': 0,
+        'assigned_tickets': 0,
+        'unassigned': 0,
+        'overdue': 0,
+        'by_status': {},
+        'by_assignee': {},
+        'reconciled_at': None,
+    }
+    shard_refs = [counter_shard_ref(i) for i in range(NUM_COUNTER_SHARDS)]
+    for shard_doc in db.get_all(shard_refs + [counter_reconcile_status_ref()]):
+        if not shard_doc.exists:
+            continue
+        shard_data = shard_doc.to_dict()
+        if shard_doc.id == 'ticket_stats_reconcile':
+            totals['reconciled_at'] = shard_data.get('reconciled_at')
+            continue
+        for field in ['total_tickets', 'assigned_tickets', 'unassigned', 'overdue']:
+            totals[field] += shard_data.get(field, 0)
+        for field in ['by_status', 'by_assignee']:
+            for key, value in shard_data.get(field, {}).items():
+                totals[field][key] = totals[field].get(key, 0) + value
+    return totals
+
+def flatten_counter_totals(totals):
+    """
+    Converts read_ticket_counters() totals into a dict keyed by counter key
+    tuples, the inverse of nest_counter_fields().
+    """
+    flat = {}
+    for field in ['total_tickets', 'assigned_tickets', 'unassigned', 'overdue']:
+        flat[(field,)] = totals[field]
+    for field in ['by_status', 'by_assignee']:
+        for key, value in totals[field].items():
+            flat[(field, key)] = value
+    return flat
+
+def acquire_counter_reconcile_lease(max_age_seconds=None):
+    """
+    Takes the reconciliation lease unless another run holds it, or (when
+    max_age_seconds is given) the counters were reconciled within that many
+    seconds. Returns True if the caller may reconcile.
+    """
+    status_ref = counter_reconcile_status_ref()
+    transaction_obj = db.transaction()
+
+    @firestore.transactional
+    def acquire_lease_transaction(transaction):
+        now = datetime.now(timezone.utc)
+        snapshot = get_snapshot_in_transaction(transaction, status_ref)
+        status = snapshot.to_dict() if snapshot is not None and snapshot.exists else {}
+        lease_until = status.get('lease_until')
+        if lease_until is not None and lease_until > now:
+            return False
+        reconciled_at = status.get('reconciled_at')
+        if max_age_seconds is not None and reconciled_at is not None \
+                and (now - reconciled_at).total_seconds() < max_age_seconds:
+            return False
+        transaction.set(status_ref, {'lease_until': now + timedelta(seconds=COUNTER_RECONCILE_LEASE_SECONDS)}, merge=True)
+        return True
+
+    return acquire_lease_transaction(transaction_obj)
+
+def reconcile_ticket_counters(max_age_seconds=None):
+    """
+    Recomputes the dashboard counters from the tickets collection and repairs
+    any drift. Ticket writes keep 'overdue' current when they change a
+    ticket's status or due date; this also counts tickets that became overdue
+    with the passing of time.
+
+    The shards are summed before the scan and the difference is added to one
+    shard with server-side increments, so ticket writes committed during the
+    scan keep their own increments. Tickets created after the shards were read
+    are skipped (their increments are not in the sum); a status or assignment
+    change that lands during the scan and is seen by it is counted twice until
+    the next run.
+
+    Returns the reconciled totals as a nested dict, or None if the run was
+    skipped because another run holds the lease (or, with max_age_seconds,
+    because the counters are recent enough).
+    """
+    if not acquire_counter_reconcile_lease(max_age_seconds):
+        return None
+    status_ref = counter_reconcile_status_ref()
+    try:
+        summed_at = datetime.now(timezone.utc)
+        summed = flatten_counter_totals(read_ticket_counters())
+
+        scanned = {('overdue',): 0}
+        now = datetime.now(timezone.utc)
+        tickets_stream = tickets_collection.select(['status', 'assigned_to_email', 'due_date', 'created_at']).stream()
+        for doc in tickets_stream:
+            ticket_data = doc.to_dict()
+            created_at = ticket_data.get('created_at')
+            if isinstance(created_at, datetime) and created_at >= summed_at:
+                continue
+            for key, value in ticket_counter_contribution(ticket_data, now).items():
+                scanned[key] = scanned.get(key, 0) + value
+
+        deltas = {}
+        for key in set(scanned) | set(summed):
+            delta = scanned.get(key, 0) - summed.get(key, 0)
+            if delta:
+                deltas[key] = delta
+
+        batch = db.batch()
+        if deltas:
+            batch.set(counter_shard_ref(0), nest_counter_fields(
+                {key: firestore.Increment(value) for key, value in deltas.items()}
+            ), merge=True)
+        batch.set(status_ref, {'reconciled_at': now, 'lease_until': None}, merge=True)
+        batch.commit()
+    except Exception:
+        # Release the lease so the next run does not have to wait for it to expire
+        status_ref.set({'lease_until': None}, merge=True)
+        raise
+
+    shard_data = nest_counter_fields(scanned)
+    shard_data.setdefault('total_tickets', 0)
+    print(f"Ticket counters reconciled: {shard_data['total_tickets']} tickets, "
+          f"{shard_data['overdue']} overdue, {len(deltas)} counters corrected")
+    return shard_data
+
+def run_counter_reconciliation(interval_seconds):
+    """
+    Background loop that reconciles the dashboard counters every interval_seconds,
+    unless another process already did so within that time.
+    """
+    while True:
+        try:
+            reconcile_ticket_counters(max_age_seconds=interval_seconds)
+        except Exception as e:
+            print(f"Error reconciling ticket counters: {e}")
+        time.sleep(interval_seconds)
+
+def start_counter_reconciliation(interval_seconds):
+    """
+    Starts the periodic counter reconciliation job in a daemon thread.
+    """
+    thread = threading.Thread(target=run_counter_reconciliation, args=(interval_seconds,), daemon=True)
+    thread.start()
+    return thread
+
+counter_reconciliation_thread = None
+counter_reconciliation_lock = threading.Lock()
+
+def ensure_counter_reconciliation():
+    """
+    Starts this process's reconciliation job if it is not running yet. Called
+    on every request so the job runs however the app is served (development
+    server, gunicorn/uWSGI workers forked after import, ...).
+    """
+    global counter_reconciliation_thread
+    if counter_reconciliation_thread is not None or not db_connected or COUNTER_RECONCILE_INTERVAL <= 0:
+        return
+    with counter_reconciliation_lock:
+        if counter_reconciliation_thread is None:
+            counter_reconciliation_thread = start_counter_reconciliation(COUNTER_RECONCILE_INTERVAL)
+
+def reset_counter_reconciliation_after_fork():
+    # Threads do not survive fork(); let the child start its own job
+    global counter_reconciliation_thread, counter_reconciliation_lock
+    counter_reconciliation_thread = None
+    counter_reconciliation_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_counter_reconciliation_after_fork)
+
+# Helper functions for keyset (cursor) pagination of ticket lists
+def encode_page_cursor(sort_value, doc_id):
+    """
+    Builds an opaque cursor from the sort key (sort field value, document ID)
+    of the last document on a page.
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps({'value': sort_value, 'id': doc_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_page_cursor back into its sort key.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(payload['value']), payload['id']
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def parse_page_size(raw_page_size):
+    """
+    Parses the 'page_size' query parameter, clamping it to MAX_PAGE_SIZE.
+    Raises ValueError if it is not a positive integer.
+    """
+    if raw_page_size is None or raw_page_size == '':
+        return DEFAULT_PAGE_SIZE
+    page_size = int(raw_page_size)
+    if page_size < 1:
+        raise ValueError("page_size must be a positive integer")
+    return min(page_size, MAX_PAGE_SIZE)
+
+def fetch_page(query, sort_field, page_size, cursor=None):
+    """
+    Runs a query one page at a time, newest first.
+    Orders by sort_field (a timestamp) with the document ID as a tie-breaker so
+    the cursor is stable.
+    Returns the page's documents and the cursor for the next page (or None).
+    """
+    query = query.order_by(sort_field, direction=firestore.Query.DESCENDING) \
+        .order_by('__name__', direction=firestore.Query.DESCENDING)
+
+    if cursor:
+        sort_value, doc_id = decode_page_cursor(cursor)
+        query = query.start_after({sort_field: sort_value, '__name__': doc_id})
+
+    # Fetch one extra document to find out whether another page exists
+    docs = list(query.limit(page_size + 1).stream())
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+
+    next_cursor = None
+    if has_more:
+        last_doc = docs[-1]
+        next_cursor = encode_page_cursor(last_doc.get(sort_field), last_doc.id)
+    return docs, next_cursor
+
+def fetch_ticket_page(query, page_size, cursor=None):
+    """
+    Fetches one page of a ticket list query ordered by 'created_at', projecting
+    only TICKET_LIST_FIELDS.
+    Returns the serialized tickets and the cursor for the next page (or None).
+    """
+    docs, next_cursor = fetch_page(query.select(TICKET_LIST_FIELDS), 'created_at', page_size, cursor)
+    tickets = [json_serializable_ticket(doc.id, doc.to_dict()) for doc in docs]
+    return tickets, next_cursor
+
+# Helper functions for streaming ticket exports
+def parse_export_datetime(raw_value):
+    """
+    Parses an ISO 8601 date or datetime query parameter as a UTC datetime.
+    Returns None if the parameter is empty; raises ValueError if it is malformed.
+    """
+    if not raw_value:
+        return None
+    parsed = datetime.fromisoformat(raw_value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def iter_ticket_export_pages(query):
+    """
+    Yields lists of serialized tickets for an export query, newest first, one
+    list per EXPORT_PAGE_SIZE page read from Firestore, so memory use stays
+    constant.
+    """
+    query = query.select([field for field in EXPORT_FIELDS if field != 'id'])
+    cursor = None
+    while True:
+        docs, cursor = fetch_page(query, 'created_at', EXPORT_PAGE_SIZE, cursor)
+        if docs:
+            yield [json_serializable_ticket(doc.id, doc.to_dict()) for doc in docs]
+        if not cursor:
+            return
+
+def iter_csv_export(ticket_pages):
+    """
+    Yields the CSV export: the header row first, then one chunk per page of tickets.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for tickets in ticket_pages:
+        buffer.seek(0)
+        buffer.truncate(0)
+        for ticket in tickets:
+            writer.writerow(['' if ticket.get(field) is None else ticket.get(field) for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+
+def iter_ndjson_export(ticket_pages):
+    """
+    Yields the NDJSON export (one JSON object per line), one chunk per page of tickets.
+    """
+    for tickets in ticket_pages:
+        yield ''.join(json.dumps({field: ticket.get(field) for field in EXPORT_FIELDS}) + '\n' for ticket in tickets)
+
+def iter_gzip(chunks):
+    """
+    Gzip-compresses a stream of text chunks, flushing after each one so the
+    client receives every page as soon as it has been read. Chunks should be
+    large (a page of rows): each flush costs compression ratio.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Live ticket feed: one shared Firestore listener per query shape, fanned out to SSE clients
+def classify_ticket_change(change_type, ticket_data):
+    """
+    Maps a Firestore document change to a feed event type: 'created',
+    'commented', 'updated' or 'removed' (the ticket left the feed's filter).
+    """
+    if change_type == 'REMOVED':
+        return 'removed'
+    updated_at = ticket_data.get('updated_at')
+    if updated_at is not None and updated_at == ticket_data.get('created_at'):
+        return 'created'
+    if updated_at is not None and updated_at == ticket_data.get('last_comment_at'):
+        return 'commented'
+    return 'updated'
+
+class TicketFeedSubscriber:
+    """
+    One connected SSE client: a bounded queue of (event_id, event) pairs, plus
+    the replayed events it missed while disconnected (sent before the queue).
+    """
+
+    def __init__(self):
+        self.events = queue.Queue(maxsize=SSE_CLIENT_QUEUE_SIZE)
+        self.missed_events = []
+        self.evicted = False
+
+class TicketFeed:
+    """
+    Shares one Firestore on_snapshot listener between every SSE client that
+    watches the same query shape (status / assignment filter).
+
+    The listener only watches tickets updated since the feed started, so it
+    never downloads the whole collection. Each change is numbered, kept in a
+    replay buffer for Last-Event-ID resumes and pushed onto every subscriber's
+    bounded queue; a subscriber whose queue is full is evicted rather than
+    slowing everyone else down.
+    """
+
+    def __init__(self, shape, query):
+        self.shape = shape
+        self.generation = f"{int(time.time() * 1000):x}" # Distinguishes event IDs across feed restarts
+        self.subscribers = set()
+        self.idle_timer = None # Pending close while nobody is watching
+        self._sequence = 0
+        self._replay_buffer = deque(maxlen=SSE_REPLAY_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        started_at = datetime.now(timezone.utc)
+        self._watch = query.where('updated_at', '>=', started_at).on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the listener's thread; an exception here would stop the listener
+        try:
+            for change in changes:
+                ticket_data = change.document.to_dict() or {}
+                event_type = classify_ticket_change(change.type.name, ticket_data)
+                ticket = {field: ticket_data.get(field) for field in TICKET_LIST_FIELDS if field in ticket_data}
+                self.publish(event_type, json_serializable_ticket(change.document.id, ticket))
+        except Exception as e:
+            print(f"Error publishing ticket feed changes for {self.shape}: {e}")
+
+    def publish(self, event_type, ticket):
+        with self._lock:
+            self._sequence += 1
+            event_id = f"{self.generation}-{self._sequence}"
+            event = {'type': event_type, 'ticket': ticket}
+            self._replay_buffer.append((self._sequence, event_id, event))
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.events.put_nowait((event_id, event))
+                except queue.Full:
+                    # Slow consumer: drop it so it cannot hold up the feed
+                    subscriber.evicted = True
+                    self.subscribers.discard(subscriber)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a new subscriber. Returns (subscriber, resumed): when
+        last_event_id belongs to this feed and is still in the replay buffer,
+        the missed events are put in subscriber.missed_events and resumed is
+        True. They are kept out of the bounded queue, so a client evicted for
+        falling behind can still resume from anywhere in the replay buffer.
+        """
+        subscriber = TicketFeedSubscriber()
+        resumed = False
+        with self._lock:
+            if last_event_id and last_event_id.startswith(f"{self.generation}-"):
+                try:
+                    last_sequence = int(last_event_id.rsplit('-', 1)[1])
+                except ValueError:
+                    last_sequence = None
+                oldest_sequence = self._replay_buffer[0][0] if self._replay_buffer else self._sequence + 1
+                if last_sequence is not None and last_sequence >= oldest_sequence - 1:
+                    subscriber.missed_events = [(event_id, event) for sequence, event_id, event in self._replay_buffer if sequence > last_sequence]
+                    resumed = True
+            self.subscribers.add(subscriber)
+        return subscriber, resumed
+
+    def unsubscribe(self, subscriber):
+        """
+        Removes a subscriber. Returns True if the feed has no subscribers left.
+        """
+        with self._lock:
+            self.subscribers.discard(subscriber)
+            return not self.subscribers
+
+    def close(self):
+        self._watch.unsubscribe()
+
+ticket_feeds = {}
+ticket_feeds_lock = threading.Lock()
+
+def ticket_feed_query(status_filter, assignment_filter, user_email=''):
+    """
+    Builds the Firestore query for a feed shape, mirroring /tickets/all filters.
+    'assigned_to_me' matches tickets assigned to user_email.
+    """
+    query = tickets_collection
+    if status_filter:
+        query = query.where('status', '==', status_filter)
+    if assignment_filter == 'unassigned':
+        query = query.where('assigned_to_email', '==', '')
+    elif assignment_filter == 'assigned_to_me':
+        query = query.where('assigned_to_email', '==', user_email)
+    return query
+
+def subscribe_to_ticket_feed(status_filter, assignment_filter, last_event_id=None, user_email=''):
+    """
+    Returns (feed, subscriber, resumed), starting the shared listener for this
+    query shape if no client is watching it yet. When SSE_MAX_FEEDS feeds are
+    open an idle one is closed to make room; returns None if none is idle.
+    """
+    if assignment_filter != 'assigned_to_me':
+        user_email = ''
+    shape = (status_filter or '', assignment_filter or '', user_email)
+    closed_feed = None
+    with ticket_feeds_lock:
+        feed = ticket_feeds.get(shape)
+        if feed is None and len(ticket_feeds) >= SSE_MAX_FEEDS:
+            closed_feed = next((idle for idle in ticket_feeds.values() if idle.idle_timer is not None), None)
+            if closed_feed is None:
+                return None
+            closed_feed.idle_timer.cancel()
+            closed_feed.idle_timer = None
+            del ticket_feeds[closed_feed.shape]
+        if feed is None:
+            feed = TicketFeed(shape, ticket_feed_query(status_filter, assignment_filter, user_email))
+            ticket_feeds[shape] = feed
+        elif feed.idle_timer is not None:
+            feed.idle_timer.cancel()
+            feed.idle_timer = None
+        subscriber, resumed = feed.subscribe(last_event_id)
+    if closed_feed is not None:
+        closed_feed.close()
+    return feed, subscriber, resumed
+
+def unsubscribe_from_ticket_feed(feed, subscriber):
+    """
+    Detaches a subscriber. Once nobody is watching, the shared listener is kept
+    for SSE_FEED_IDLE_SECONDS so a client that reconnects (page navigation,
+    network blip) can still resume from its Last-Event-ID.
+    """
+    with ticket_feeds_lock:
+        if feed.unsubscribe(subscriber) and ticket_feeds.get(feed.shape) is feed and feed.idle_timer is None:
+            feed.idle_timer = threading.Timer(SSE_FEED_IDLE_SECONDS, close_idle_ticket_feed, args=(feed,))
+            feed.idle_timer.daemon = True
+            feed.idle_timer.start()
+
+def close_idle_ticket_feed(feed):
+    """
+    Stops a feed's listener if no client came back during its grace period.
+    """
+    with ticket_feeds_lock:
+        feed.idle_timer = None
+        if feed.subscribers or ticket_feeds.get(feed.shape) is not feed:
+            return
+        del ticket_feeds[feed.shape]
+    try:
+        feed.close()
+    except Exception as e:
+        print(f"Error closing idle ticket feed {feed.shape}: {e}")
+
+def format_sse(event_type, data, event_id=None):
+    """
+    Formats one Server-Sent Events message.
+    """
+    message = f"event: {event_type}\n"
+    if event_id:
+        message = f"id: {event_id}\n" + message
+    return message + f"data: {json.dumps(data)}\n\n"
+
+# --- Ticket API endpoints ---
+@app.route('/tickets/my', methods=['GET'])
+def get_my_tickets():
+    """
+    API endpoint to get tickets created by a specific user.
+    Requires 'userId' as a query parameter.
+    Paginated with the optional 'page_size' and 'cursor' query parameters.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        page_size = parse_page_size(request.args.get('page_size'))
+    except ValueError:
+        return jsonify({"error": "page_size must be a positive integer"}), 400
+
+    try:
+        # Query tickets where 'creator_uid' matches the provided user_id, newest first.
+        # Note: For order_by to work with where clause, you might need a Firestore index.
+        query = tickets_collection.where('creator_uid', '==', user_id)
+        tickets, next_cursor = fetch_ticket_page(query, page_size, request.args.get('cursor'))
+        return jsonify({"tickets": tickets, "next_cursor": next_cursor, "page_size": page_size}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching my tickets: {e}")
+        return jsonify({"error": f"Failed to fetch your tickets: {e}"}), 500
+
+@app.route('/tickets/all', methods=['GET'])
+def get_all_tickets():
+    """
+    API endpoint to get all tickets (typically for support roles).
+    Supports filtering by status and assignment.
+    Paginated with the optional 'page_size' and 'cursor' query parameters.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    status_filter = request.args.get('status')
+    assignment_filter = request.args.get('assignment')
+
+    try:
+        page_size = parse_page_size(request.args.get('page_size'))
+    except ValueError:
+        return jsonify({"error": "page_size must be a positive integer"}), 400
+
+    query = tickets_collection
+
+    if status_filter:
+        query = query.where('status', '==', status_filter)
+
+    if assignment_filter == 'unassigned':
+        query = query.where('assigned_to_email', '==', '')
+    # Add other assignment filters if needed (e.g., 'assigned_to_me')
+    try:
+        tickets, next_cursor = fetch_ticket_page(query, page_size, request.args.get('cursor'))
+        return jsonify({"tickets": tickets, "next_cursor": next_cursor, "page_size": page_size}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching all tickets: {e}")
+        return jsonify({"error": f"Failed to fetch all tickets: {e}"}), 500
+
+@app.route('/tickets/counts', methods=['GET'])
+def get_ticket_counts():
+    """
+    API endpoint to get the dashboard ticket counts shown in the status filter bar.
+    Reads the sharded counters instead of scanning the tickets collection (the
+    first call after deployment reconciles them once).
+    Accepts an optional 'userEmail' query parameter for the assignment counts.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    user_email = request.args.get('userEmail', '')
+
+    try:
+        totals = read_ticket_counters()
+        if totals['reconciled_at'] is None:
+            # Counters only track writes made since this code was deployed;
+            # count the existing tickets once before answering
+            if reconcile_ticket_counters() is not None:
+                totals = read_ticket_counters()
+        assigned_to_me = totals['by_assignee'].get(user_email, 0) if user_email else 0
+        counts = {
+            'total_tickets': totals['total_tickets'],
+            'open_tickets': totals['by_status'].get('Open', 0),
+            'in_progress_tickets': totals['by_status'].get('InProgress', 0),
+            'assigned_to_me': assigned_to_me,
+            'assigned_to_others': totals['assigned_tickets'] - assigned_to_me,
+            'unassigned': totals['unassigned'],
+            'closed_tickets': totals['by_status'].get('Closed', 0),
+            'overdue': totals['overdue'],
+            'by_status': totals['by_status'],
+            'by_assignee': totals['by_assignee'],
+        }
+        return jsonify(counts), 200
+    except Exception as e:
+        print(f"Error fetching ticket counts: {e}")
+        return jsonify({"error": f"Failed to fetch ticket counts: {e}"}), 500
+
+@app.route('/tickets/counts/reconcile', methods=['POST'])
+def reconcile_ticket_counts():
+    """
+    API endpoint to rebuild the dashboard counters from the tickets collection.
+    Intended for a scheduler (e.g. cron) or manual repair.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    try:
+        shard_data = reconcile_ticket_counters()
+        if shard_data is None:
+            return jsonify({"error": "A counter reconciliation is already running."}), 409
+        return jsonify({
+            "message": "Ticket counters reconciled successfully!",
+            "total_tickets": shard_data.get('total_tickets', 0),
+            "overdue": shard_data['overdue']
+        }), 200
+    except Exception as e:
+        print(f"Error reconciling ticket counters: {e}")
+        return jsonify({"error": f"Error reconciling ticket counters: {e}"}), 500
+
+@app.route('/tickets/export', methods=['GET'])
+def export_tickets():
+    """
+    API endpoint to export tickets as a streamed CSV or NDJSON download.
+    Query parameters: 'format' ('csv' or 'ndjson'), 'start' (inclusive) and
+    'end' (exclusive) ISO dates on created_at, 'status' and 'assigned_to_email'.
+    The response is gzip-compressed when the client accepts it.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ['csv', 'ndjson']:
+        return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+
+    try:
+        start = parse_export_datetime(request.args.get('start'))
+        end = parse_export_datetime(request.args.get('end'))
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO 8601 dates"}), 400
+
+    query = tickets_collection
+    if start:
+        query = query.where('created_at', '>=', start)
+    if end:
+        query = query.where('created_at', '<', end)
+    if request.args.get('status'):
+        query = query.where('status', '==', request.args.get('status'))
+    if request.args.get('assigned_to_email') is not None:
+        query = query.where('assigned_to_email', '==', request.args.get('assigned_to_email'))
+
+    def generate():
+        ticket_pages = iter_ticket_export_pages(query)
+        try:
+            if export_format == 'csv':
+                yield from iter_csv_export(ticket_pages)
+            else:
+                yield from iter_ndjson_export(ticket_pages)
+        except Exception as e:
+            # Headers are already sent, so the error can only be logged
+            print(f"Error exporting tickets: {e}")
+            raise
+
+    if export_format == 'csv':
+        mimetype = 'text/csv'
+    else:
+        mimetype = 'application/x-ndjson'
+    headers = {
+        'Content-Disposition': f'attachment; filename=tickets.{export_format}',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no', # Stop proxies (e.g. nginx) from buffering the stream
+    }
+
+    body = generate()
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = iter_gzip(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+@app.route('/tickets/stream', methods=['GET'])
+def stream_tickets():
+    """
+    API endpoint streaming live ticket changes as Server-Sent Events.
+    Accepts the same 'status' and 'assignment' filters as /tickets/all and emits
+    'created', 'updated', 'commented' and 'removed' events carrying the ticket's
+    list fields. 'status' must be one of TICKET_STATUSES;
+    'assignment=assigned_to_me' requires a 'userEmail' query parameter and
+    'assigned_to_others' cannot be watched and is rejected. Answers 503 when
+    SSE_MAX_FEEDS feeds are already being watched.
+    Reconnecting clients resume from the Last-Event-ID header (or
+    'last_event_id' query parameter); if that is no longer possible a 'reset'
+    event tells the client to reload the list once.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    status_filter = request.args.get('status')
+    assignment_filter = request.args.get('assignment')
+    user_email = request.args.get('userEmail', '')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    if status_filter and status_filter not in TICKET_STATUSES:
+        return jsonify({"error": f"Invalid status. Must be one of: {', '.join(TICKET_STATUSES)}"}), 400
+    if assignment_filter and assignment_filter not in SSE_ASSIGNMENT_FILTERS:
+        return jsonify({"error": f"Assignment filter '{assignment_filter}' is not supported for live updates."}), 400
+    if assignment_filter == 'assigned_to_me' and not user_email:
+        return jsonify({"error": "userEmail is required for the 'assigned_to_me' filter."}), 400
+
+    try:
+        subscription = subscribe_to_ticket_feed(status_filter, assignment_filter, last_event_id, user_email)
+    except Exception as e:
+        print(f"Error starting ticket feed: {e}")
+        return jsonify({"error": f"Failed to start ticket feed: {e}"}), 500
+    if subscription is None:
+        return jsonify({"error": "Too many live ticket feeds are open; try again later."}), 503
+    feed, subscriber, resumed = subscription
+
+    def generate():
+        try:
+            # Tell the browser how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            if last_event_id and not resumed:
+                yield format_sse('reset', {"reason": "Missed events are no longer available; reload the list."})
+            # Replay what was missed; newer events wait in the queue meanwhile
+            for event_id, event in subscriber.missed_events:
+                if subscriber.evicted:
+                    break
+                yield format_sse(event['type'], event['ticket'], event_id)
+            subscriber.missed_events = []
+            while not subscriber.evicted:
+                try:
+                    event_id, event = subscriber.events.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse(event['type'], event['ticket'], event_id)
+            # Evicted for falling behind: the client reconnects and resumes or resets
+            yield format_sse('evicted', {"reason": "Client fell too far behind."})
+        finally:
+            unsubscribe_from_ticket_feed(feed, subscriber)
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Stop proxies (e.g. nginx) from buffering the stream
+    }
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+@app.route('/create', methods=['POST'])
+def create_ticket():
+    """
+    API endpoint to create a new ticket in Firestore. Expects JSON input.
+    Assigns an 'ITXXXXXX' display ID from this process's reserved ID block.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    data = request.get_json()
+    title = data.get('title')
+    description = data.get('description')
+    reporter = data.get('reporter')
+    status = data.get('status') or 'Open'
+    priority = data.get('priority', 'Low')
+    creator_uid = data.get('creator_uid')
+    creator_email = data.get('creator_email')
+
+    if not all([title, description, reporter, creator_uid, creator_email]):
+        return jsonify({"error": "Title, Description, Reporter, Creator ID, and Creator Email are required!"}), 400
+    if status not in TICKET_STATUSES:
+        return jsonify({"error": f"Invalid status. Must be one of: {', '.join(TICKET_STATUSES)}"}), 400
+
+    try:
+        # Take the next display ID from the in-memory block; this only touches the
+        # counter document when the block is used up.
+        display_id = ticket_id_allocator.next_display_id()
+
+        # Start a Firestore transaction
+        transaction_obj = db.transaction()
+
+        # Define the transactional function
+        # This function will be executed atomically
+        @firestore.transactional
+        def create_ticket_transaction(transaction):
+            now = datetime.now(timezone.utc)
+            new_ticket_data = {
+                'title': title,
+                'description': description,
+                'status': status,
+                'priority': priority,
+                'reporter': reporter,
+                'creator_uid': creator_uid,
+                'creator_email': creator_email,
+                'assigned_to_email': '', # Initialize as empty
+                'comment_count': 0, # Comments live in the 'comments' subcollection
+                'last_replier': '',
+                'created_at': now,
+                'updated_at': now, # Equal to created_at until the ticket is first changed
+                'display_id': display_id # Store the generated display ID
+            }
+
+            # Add the new ticket document within the transaction
+            doc_ref = tickets_collection.document() # Let Firestore generate the document ID
+            transaction.set(doc_ref, new_ticket_data)
+
+            # Keep the dashboard counters in step with the new ticket
+            apply_counter_deltas(transaction, ticket_counter_deltas(None, new_ticket_data))
+
+            # Return the Firestore document ID
+            return doc_ref.id
+
+        # Run the transaction
+        # Call the transactional function with the transaction object
+        ticket_id = create_ticket_transaction(transaction_obj)
+
+        # Return both IDs to the frontend
+        return jsonify({
+            "message": "Ticket created successfully!",
+            "ticket_id": ticket_id,
+            "display_id": display_id
+        }), 201
+    except Exception as e:
+        # Print the full traceback for debugging
+        import traceback
+        print(f"Error creating ticket: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": f"Error creating ticket: {e}"}), 500
+
+@app.route('/ticket/<ticket_id>', methods=['GET'])
+def get_ticket_detail(ticket_id):
+    """
+    API endpoint to get details of a single ticket from Firestore.
+    Comments live in a subcollection; fetch them from /ticket/<ticket_id>/comments.
+    (Tickets keep their legacy 'comments' array, which the Node backend still uses,
+    until migrate_comments.py --delete-embedded removes it.)
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    try:
+        ticket_doc = tickets_collection.document(ticket_id).get()
+        if not ticket_doc.exists:
+            return jsonify({"error": "Ticket not found"}), 404
+
+        ticket_data = ticket_doc.to_dict()
+        return jsonify(json_serializable_ticket(ticket_doc.id, ticket_data)), 200
+    except Exception as e:
+        print(f"Error retrieving ticket: {e}")
+        return jsonify({"error": f"Error retrieving ticket: {e}"}), 500
+
+# Helper function to build the Firestore update for a ticket patch
+def build_ticket_update_fields(data):
+    """
+    Builds the fields to update from a ticket patch (status, priority,
+    assigned_to_email), always stamping 'updated_at'.
+    Raises ValueError if the patch sets an unknown status.
+    """
+    update_fields = {
+        'updated_at': datetime.now(timezone.utc)
+    }
+    if data.get('status'):
+        if data.get('status') not in TICKET_STATUSES:
+            raise ValueError(f"Invalid status. Must be one of: {', '.join(TICKET_STATUSES)}")
+        update_fields['status'] = data.get('status')
+    if data.get('priority'):
+        update_fields['priority'] = data.get('priority')
+    if data.get('assigned_to_email') is not None: # Allow setting to empty string to unassign
+        update_fields['assigned_to_email'] = data.get('assigned_to_email')
+    return update_fields
+
+def is_transaction_contention(error):
+    """
+    Returns True if error means a transaction kept conflicting with concurrent
+    writes: Aborted, or the ValueError firestore.transactional raises (from the
+    last Aborted) once it runs out of attempts.
+    """
+    if isinstance(error, ValueError):
+        error = error.__cause__
+    return isinstance(error, google_exceptions.Aborted)
+
+def bulk_update_ticket_chunk(ticket_ids, update_fields):
+    """
+    Applies update_fields to up to BULK_CHUNK_SIZE tickets in a single
+    transaction, together with the matching dashboard counter changes.
+    If the transaction keeps conflicting (e.g. with agents editing one of the
+    tickets), each half of the chunk is retried on its own, so only the
+    tickets that really conflict end up reported as failed. Any other error
+    (Firestore unavailable, permission denied) fails the whole chunk.
+    Returns a dict of ticket ID -> error message (None on success).
+    """
+    transaction_obj = db.transaction()
+
+    @firestore.transactional
+    def bulk_update_transaction(transaction):
+        ticket_refs = [tickets_collection.document(ticket_id) for ticket_id in ticket_ids]
+        snapshots = {doc.id: doc for doc in transaction.get_all(ticket_refs)}
+        results = {}
+        deltas = {}
+        for ticket_ref in ticket_refs:
+            ticket_doc = snapshots.get(ticket_ref.id)
+            if not ticket_doc or not ticket_doc.exists:
+                results[ticket_ref.id] = "Ticket not found"
+                continue
+            old_ticket_data = ticket_doc.to_dict()
+            new_ticket_data = {**old_ticket_data, **update_fields}
+            transaction.update(ticket_ref, update_fields)
+            for key, value in ticket_counter_deltas(old_ticket_data, new_ticket_data).items():
+                deltas[key] = deltas.get(key, 0) + value
+            results[ticket_ref.id] = None
+        apply_counter_deltas(transaction, {key: value for key, value in deltas.items() if value != 0})
+        return results
+
+    try:
+        return bulk_update_transaction(transaction_obj)
+    except Exception as e:
+        if not is_transaction_contention(e):
+            print(f"Error bulk updating {len(ticket_ids)} tickets: {e}")
+            return {ticket_id: f"Error updating ticket: {e}" for ticket_id in ticket_ids}
+        if len(ticket_ids) == 1:
+            print(f"Error bulk updating ticket {ticket_ids[0]}: {e}")
+            return {ticket_ids[0]: f"Error updating ticket: {e}"}
+        middle = len(ticket_ids) // 2
+        results = bulk_update_ticket_chunk(ticket_ids[:middle], update_fields)
+        results.update(bulk_update_ticket_chunk(ticket_ids[middle:], update_fields))
+        return results
+
+@app.route('/tickets/bulk_update', methods=['POST'])
+def bulk_update_tickets_api():
+    """
+    API endpoint to apply one patch (status, priority and/or assigned_to_email)
+    to many tickets. Expects JSON input with 'ticket_ids' and the patch fields.
+    Tickets are committed in chunks of BULK_CHUNK_SIZE, a few chunks in
+    parallel, and the result for each ticket is reported individually.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    data = request.get_json()
+    ticket_ids = data.get('ticket_ids')
+    if not isinstance(ticket_ids, list) or not ticket_ids or not all(isinstance(ticket_id, str) and ticket_id for ticket_id in ticket_ids):
+        return jsonify({"error": "ticket_ids must be a non-empty list of ticket IDs"}), 400
+    ticket_ids = list(dict.fromkeys(ticket_ids)) # Drop duplicates, keep order
+    if len(ticket_ids) > BULK_MAX_TICKETS:
+        return jsonify({"error": f"At most {BULK_MAX_TICKETS} tickets can be updated at once"}), 400
+
+    try:
+        update_fields = build_ticket_update_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(update_fields) == 1: # Only 'updated_at'
+        return jsonify({"error": "Nothing to update: provide status, priority or assigned_to_email"}), 400
+
+    try:
+        chunks = [ticket_ids[i:i + BULK_CHUNK_SIZE] for i in range(0, len(ticket_ids), BULK_CHUNK_SIZE)]
+        errors = {}
+        with ThreadPoolExecutor(max_workers=BULK_MAX_PARALLEL_COMMITS) as executor:
+            # Run each chunk in a copy of this request's context so its Firestore
+            # reads and writes are recorded against this route and request
+            futures = [executor.submit(contextvars.copy_context().run, bulk_update_ticket_chunk, chunk, update_fields) for chunk in chunks]
+            for future in futures:
+                errors.update(future.result())
+
+        results = []
+        for ticket_id in ticket_ids:
+            if errors.get(ticket_id):
+                results.append({"ticket_id": ticket_id, "success": False, "error": errors[ticket_id]})
+            else:
+                results.append({"ticket_id": ticket_id, "success": True})
+        updated = sum(1 for result in results if result['success'])
+        patch = {field: value for field, value in update_fields.items() if field != 'updated_at'}
+        print(f"Bulk update applied to {updated} of {len(ticket_ids)} tickets: {patch}")
+        return jsonify({"updated": updated, "failed": len(ticket_ids) - updated, "results": results}), 200
+    except Exception as e:
+        print(f"Error bulk updating tickets: {e}")
+        return jsonify({"error": f"Error bulk updating tickets: {e}"}), 500
+
+@app.route('/ticket/<ticket_id>/update', methods=['POST'])
+def update_ticket_api(ticket_id):
+    """
+    API endpoint to update ticket status and priority in Firestore. Expects JSON input.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    data = request.get_json()
+    new_status = data.get('status')
+    new_priority = data.get('priority')
+    assigned_to_email = data.get('assigned_to_email') # New field for assignment
+
+    try:
+        update_fields = build_ticket_update_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        transaction_obj = db.transaction()
+
+        # Update the ticket and the dashboard counters atomically
+        @firestore.transactional
+        def update_ticket_transaction(transaction):
+            ticket_ref = tickets_collection.document(ticket_id)
+            ticket_doc = get_snapshot_in_transaction(transaction, ticket_ref)
+            if not ticket_doc or not ticket_doc.exists:
+                return False
+
+            old_ticket_data = ticket_doc.to_dict()
+            new_ticket_data = {**old_ticket_data, **update_fields}
+            transaction.update(ticket_ref, update_fields)
+            apply_counter_deltas(transaction, ticket_counter_deltas(old_ticket_data, new_ticket_data))
+            return True
+
+        if not update_ticket_transaction(transaction_obj):
+            return jsonify({"error": "Ticket not found"}), 404
+
+        print(f"Ticket {ticket_id} updated with new status: {new_status}, priority: {new_priority}, assigned to: {assigned_to_email}")
+        return jsonify({"message": "Ticket updated successfully!"}), 200
+    except Exception as e:
+        print(f"Error updating ticket: {e}")
+        return jsonify({"error": f"Error updating ticket: {e}"}), 500
+
+@app.route('/ticket/<ticket_id>/add_comment', methods=['POST'])
+def add_comment_api(ticket_id):
+    """
+    API endpoint to add a comment to a ticket in Firestore. Expects JSON input.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    data = request.get_json()
+    comment_text = data.get('comment_text')
+    commenter_name = data.get('commenter_name', 'Anonymous')
+
+    if not comment_text:
+        return jsonify({"error": "Comment text cannot be empty!"}), 400
+
+    now = datetime.now(timezone.utc) # Use timezone-aware datetime
+    new_comment = {
+        'text': comment_text,
+        'commenter': commenter_name,
+        'timestamp': now
+    }
+
+    try:
+        # Store the comment in the ticket's 'comments' subcollection and update the
+        # denormalized comment fields on the ticket in one atomic batch
+        ticket_ref = tickets_collection.document(ticket_id)
+        comment_ref = ticket_ref.collection('comments').document()
+        batch = db.batch()
+        batch.set(comment_ref, new_comment)
+        batch.update(ticket_ref, {
+            'comment_count': firestore.Increment(1),
+            'last_replier': commenter_name,
+            'last_comment_at': now, # Lets the live feed tell comments from other updates
+            'updated_at': now
+        })
+        batch.commit()
+        print(f"Comment added to ticket {ticket_id} by {commenter_name}")
+        return jsonify({"message": "Comment added successfully!", "comment_id": comment_ref.id}), 200
+    except Exception as e:
+        print(f"Error adding comment: {e}")
+        return jsonify({"error": f"Error adding comment: {e}"}), 500
+
+@app.route('/ticket/<ticket_id>/comments', methods=['GET'])
+def get_ticket_comments(ticket_id):
+    """
+    API endpoint to get a ticket's comments, newest first.
+    Paginated with the optional 'page_size' and 'cursor' query parameters.
+    """
+    if not db_connected:
+        return jsonify({"error": "Database connection not established."}), 500
+
+    try:
+        page_size = parse_page_size(request.args.get('page_size'))
+    except ValueError:
+        return jsonify({"error": "page_size must be a positive integer"}), 400
+
+    try:
+        comments_query = tickets_collection.document(ticket_id).collection('comments')
+        docs, next_cursor = fetch_page(comments_query, 'timestamp', page_size, request.args.get('cursor'))
+        comments = [json_serializable_comment(doc.id, doc.to_dict()) for doc in docs]
+        return jsonify({"comments": comments, "next_cursor": next_cursor, "page_size": page_size}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching comments: {e}")
+        return jsonify({"error": f"Failed to fetch comments: {e}"}), 500
+
+# Run the development server when executed directly
+if __name__ == '__main__':
+    # Run the Flask app in debug mode (set to False in production)
+    app.run(debug=True)
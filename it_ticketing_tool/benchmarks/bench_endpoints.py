@@ -0,0 +1,476 @@
+"""
+Load-test the ticket API against seeded in-memory datasets.
+
+For each dataset size the in-memory Firestore stand-in is seeded with that many
+tickets (plus comment threads on a few of them and matching dashboard
+counters), then every endpoint scenario is driven through the Flask test
+client from N worker threads. Per endpoint it reports req/s, p50/p95/p99
+latency, peak RSS while the scenario ran, Firestore reads/writes per request,
+transaction retries and errors. A bulk update that answers 200 but reports
+failed tickets counts as an error, and its failed tickets are reported as
+failed_items.
+
+Results are written as one JSON document so runs can be diffed; --compare
+checks a run against a saved baseline and exits non-zero on regressions. Use
+--repeat on noisy machines so each endpoint reports its median run.
+
+Not covered: /login and /register (Firebase Auth is not faked) and
+/tickets/stream (a long-lived connection, not a request/response endpoint).
+
+Usage (from it_ticketing_tool/):
+    python benchmarks/bench_endpoints.py --datasets 1000,100000 --output baseline.json
+    python benchmarks/bench_endpoints.py --datasets 1000,100000 --repeat 3 --compare baseline.json
+    python benchmarks/bench_endpoints.py --datasets 1000000 --endpoints tickets_all,create
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# app reports its Firebase connection on import; keep stdout for the JSON report
+with contextlib.redirect_stdout(sys.stderr):
+    import app as ticketing_app  # noqa: E402
+    from bench_ticket_ids import percentile, use_fake_database  # noqa: E402
+
+NUM_USERS = 500
+STATUSES = ['Open', 'In Progress', 'Resolved', 'Closed']
+PRIORITIES = ['Low', 'Medium', 'High']
+# Tickets that get a seeded comment thread, and the thread length
+COMMENTED_TICKETS = 50
+COMMENTS_PER_TICKET = 120
+# Tickets changed by one /tickets/bulk_update request
+BULK_UPDATE_SIZE = 100
+# Scenarios answering 200 with a per-item 'failed' count in the body
+BATCH_SCENARIOS = {'bulk_update'}
+# Tickets are spread over this many days before the seeding time
+DATASET_DAYS = 365
+
+
+def generate_tickets(count, rng, now):
+    """Yields (doc_id, ticket_data) for count tickets shaped like /create's."""
+    for index in range(count):
+        created_at = now - timedelta(seconds=rng.random() * DATASET_DAYS * 86400)
+        user_index = rng.randrange(NUM_USERS)
+        assigned = rng.random() < 0.6
+        ticket = {
+            'title': f'Ticket {index}',
+            'description': 'Seeded by bench_endpoints.py',
+            'status': rng.choice(STATUSES),
+            'priority': rng.choice(PRIORITIES),
+            'reporter': f'user-{user_index}',
+            'creator_uid': f'uid-{user_index}',
+            'creator_email': f'user-{user_index}@example.com',
+            'assigned_to_email': f'agent-{rng.randrange(20)}@example.com' if assigned else '',
+            'comment_count': 0,
+            'last_replier': '',
+            'created_at': created_at,
+            'updated_at': created_at,
+            'display_id': ticketing_app.format_ticket_display_id(index + 1),
+        }
+        if rng.random() < 0.3:
+            ticket['due_date'] = created_at + timedelta(days=rng.randrange(1, 30))
+        yield f'{rng.getrandbits(80):020x}', ticket
+
+
+def seed_dataset(fake_db, ticket_count, rng):
+    """
+    Seeds tickets, comment threads, the display ID counter and the dashboard
+    counters. Returns the context the request scenarios draw from.
+    """
+    now = datetime.now(timezone.utc)
+    ticket_ids = []
+
+    def remember_ids(tickets):
+        for doc_id, ticket in tickets:
+            ticket_ids.append(doc_id)
+            yield doc_id, ticket
+
+    fake_db.seed('tickets', remember_ids(generate_tickets(ticket_count, rng, now)))
+
+    commented_ticket_ids = ticket_ids[:COMMENTED_TICKETS]
+    tickets = fake_db._collections['tickets']
+    for ticket_id in commented_ticket_ids:
+        ticket = tickets[ticket_id]
+        comments = []
+        for index in range(COMMENTS_PER_TICKET):
+            comment = {
+                'text': f'Comment {index}',
+                'commenter': f'user-{rng.randrange(NUM_USERS)}',
+                'timestamp': ticket['created_at'] + timedelta(minutes=index),
+            }
+            comments.append((f'{rng.getrandbits(80):020x}', comment))
+        fake_db.seed(f'tickets/{ticket_id}/comments', comments)
+        ticket['comment_count'] = COMMENTS_PER_TICKET
+        ticket['last_replier'] = comments[-1][1]['commenter']
+        ticket['last_comment_at'] = ticket['updated_at'] = comments[-1][1]['timestamp']
+
+    fake_db.seed('counters', [('ticket_id_counter', {'count': ticket_count})])
+    ticketing_app.reconcile_ticket_counters()
+
+    # The busiest export a support agent would typically run: one day of tickets
+    export_day = (now - timedelta(days=DATASET_DAYS // 2)).date()
+    return {
+        'ticket_ids': ticket_ids,
+        'commented_ticket_ids': commented_ticket_ids,
+        'export_start': export_day.isoformat(),
+        'export_end': (export_day + timedelta(days=1)).isoformat(),
+    }
+
+
+# --- Request scenarios: each sends one request and returns the response ---
+def scenario_tickets_all(client, rng, context):
+    return client.get('/tickets/all')
+
+
+def scenario_tickets_all_filtered(client, rng, context):
+    return client.get('/tickets/all?status=Open&assignment=unassigned')
+
+
+def scenario_tickets_all_page_2(client, rng, context):
+    return client.get(f"/tickets/all?cursor={context['tickets_all_cursor']}")
+
+
+def scenario_tickets_my(client, rng, context):
+    return client.get(f'/tickets/my?userId=uid-{rng.randrange(NUM_USERS)}')
+
+
+def scenario_ticket_detail(client, rng, context):
+    return client.get(f"/ticket/{rng.choice(context['ticket_ids'])}")
+
+
+def scenario_ticket_comments(client, rng, context):
+    return client.get(f"/ticket/{rng.choice(context['commented_ticket_ids'])}/comments")
+
+
+def scenario_ticket_counts(client, rng, context):
+    return client.get('/tickets/counts')
+
+
+def scenario_export_ndjson(client, rng, context):
+    response = client.get(f"/tickets/export?format=ndjson&start={context['export_start']}&end={context['export_end']}")
+    response.get_data() # Drain the streamed body so the whole export is timed
+    return response
+
+
+def scenario_create(client, rng, context):
+    user_index = rng.randrange(NUM_USERS)
+    return client.post('/create', json={
+        'title': 'Load test ticket',
+        'description': 'Created by bench_endpoints.py',
+        'reporter': f'user-{user_index}',
+        'creator_uid': f'uid-{user_index}',
+        'creator_email': f'user-{user_index}@example.com',
+    })
+
+
+def scenario_update(client, rng, context):
+    return client.post(f"/ticket/{rng.choice(context['ticket_ids'])}/update", json={
+        'status': rng.choice(STATUSES),
+        'assigned_to_email': f'agent-{rng.randrange(20)}@example.com',
+    })
+
+
+def scenario_add_comment(client, rng, context):
+    return client.post(f"/ticket/{rng.choice(context['ticket_ids'])}/add_comment", json={
+        'comment_text': 'Load test comment',
+        'commenter_name': f'user-{rng.randrange(NUM_USERS)}',
+    })
+
+
+def scenario_bulk_update(client, rng, context):
+    return client.post('/tickets/bulk_update', json={
+        'ticket_ids': rng.sample(context['ticket_ids'], min(BULK_UPDATE_SIZE, len(context['ticket_ids']))),
+        'status': rng.choice(STATUSES),
+    })
+
+
+# Read scenarios run first so they all see the freshly seeded dataset
+SCENARIOS = [
+    ('tickets_all', 'GET /tickets/all', scenario_tickets_all),
+    ('tickets_all_filtered', 'GET /tickets/all?status&assignment', scenario_tickets_all_filtered),
+    ('tickets_all_page_2', 'GET /tickets/all?cursor', scenario_tickets_all_page_2),
+    ('tickets_my', 'GET /tickets/my', scenario_tickets_my),
+    ('ticket_detail', 'GET /ticket/<ticket_id>', scenario_ticket_detail),
+    ('ticket_comments', 'GET /ticket/<ticket_id>/comments', scenario_ticket_comments),
+    ('ticket_counts', 'GET /tickets/counts', scenario_ticket_counts),
+    ('export_ndjson', 'GET /tickets/export?format=ndjson (one day)', scenario_export_ndjson),
+    ('create', 'POST /create', scenario_create),
+    ('update', 'POST /ticket/<ticket_id>/update', scenario_update),
+    ('add_comment', 'POST /ticket/<ticket_id>/add_comment', scenario_add_comment),
+    ('bulk_update', f'POST /tickets/bulk_update ({BULK_UPDATE_SIZE} tickets)', scenario_bulk_update),
+]
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def max_rss_bytes():
+    """High-water mark of this process's RSS, or None if it cannot be read."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024 # Bytes on macOS, KiB elsewhere
+
+
+class RssSampler:
+    """Samples RSS on a background thread and keeps the peak."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if self.peak is None:
+            # Without /proc fall back to the process-wide high-water mark
+            self.peak = max_rss_bytes()
+
+
+def to_mb(num_bytes):
+    return round(num_bytes / (1024 * 1024), 1) if num_bytes is not None else None
+
+
+def run_scenario(client, fake_db, scenario, context, workers, requests, seed):
+    name, description, send_request = scenario
+    latencies = []
+    status_codes = {}
+    # Batch requests that reported failed items, and the failed items themselves
+    partial_failures = [0, 0]
+    results_lock = threading.Lock()
+    start_barrier = threading.Barrier(workers)
+    stats_before = dict(fake_db.stats)
+
+    def worker(worker_index):
+        rng = random.Random(f'{seed}-{name}-{worker_index}')
+        worker_requests = requests // workers + (1 if worker_index < requests % workers else 0)
+        start_barrier.wait()
+        for _ in range(worker_requests):
+            started = time.perf_counter()
+            response = send_request(client, rng, context)
+            elapsed = time.perf_counter() - started
+            failed_items = 0
+            if name in BATCH_SCENARIOS and response.status_code < 400:
+                failed_items = (response.get_json(silent=True) or {}).get('failed', 0)
+            with results_lock:
+                latencies.append(elapsed)
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+                if failed_items:
+                    partial_failures[0] += 1
+                    partial_failures[1] += failed_items
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    completed = len(latencies)
+    stats_delta = {key: fake_db.stats[key] - stats_before[key] for key in fake_db.stats}
+    return {
+        'endpoint': name,
+        'description': description,
+        'requests': completed,
+        # HTTP errors plus batch requests in which any item failed
+        'errors': sum(count for status, count in status_codes.items() if status >= 400) + partial_failures[0],
+        'failed_items': partial_failures[1],
+        'status_codes': {str(status): count for status, count in sorted(status_codes.items())},
+        'req_per_s': round(completed / wall_time, 1) if wall_time else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'peak_rss_mb': to_mb(rss.peak),
+        'firestore_reads_per_request': round(stats_delta['reads'] / completed, 1) if completed else 0.0,
+        'firestore_writes_per_request': round(stats_delta['writes'] / completed, 1) if completed else 0.0,
+        'transaction_retries': stats_delta['transaction_retries'],
+    }
+
+
+def run_dataset(ticket_count, scenarios, args):
+    fake_db = use_fake_database(0.0) # No latency while seeding
+    ticketing_app.ticket_id_allocator = ticketing_app.TicketIdAllocator(args.block_size)
+    client = ticketing_app.app.test_client()
+
+    started = time.perf_counter()
+    context = seed_dataset(fake_db, ticket_count, random.Random(f'{args.seed}-{ticket_count}'))
+    seed_seconds = time.perf_counter() - started
+    # The seeded documents stand in for data that lives in Firestore, not in the
+    # app process; keep them out of the garbage collector's full collections
+    gc.collect()
+    gc.freeze()
+    rss_after_seed_mb = to_mb(current_rss_bytes())
+
+    # Warm up once per scenario: builds the fake's query indexes (which real
+    # Firestore maintains ahead of time) and finds a cursor for page 2
+    context['tickets_all_cursor'] = client.get('/tickets/all').get_json().get('next_cursor') or ''
+    warmup_rng = random.Random(args.seed)
+    for scenario in scenarios:
+        scenario[2](client, warmup_rng, context)
+
+    fake_db.latency = args.latency_ms / 1000
+    results = []
+    for scenario in scenarios:
+        runs = [
+            run_scenario(client, fake_db, scenario, context, args.workers, args.requests, f'{args.seed}-{run}')
+            for run in range(args.repeat)
+        ]
+        # Report the median run by p95 so one noisy run does not skew comparisons
+        result = sorted(runs, key=lambda run: run['p95_ms'])[len(runs) // 2]
+        result['dataset_tickets'] = ticket_count
+        results.append(result)
+        print(format_result(result), file=sys.stderr)
+
+    dataset = {
+        'dataset_tickets': ticket_count,
+        'seed_seconds': round(seed_seconds, 2),
+        'rss_after_seed_mb': rss_after_seed_mb,
+    }
+    gc.unfreeze()
+    return dataset, results
+
+
+def format_result(result):
+    return (
+        f"{result['dataset_tickets']:>8} tickets  {result['endpoint']:<22} "
+        f"{result['req_per_s']:>8} req/s  p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+        f"p99={result['p99_ms']}ms  rss={result['peak_rss_mb']}MB  "
+        f"reads/req={result['firestore_reads_per_request']} writes/req={result['firestore_writes_per_request']} "
+        f"errors={result['errors']} failed_items={result['failed_items']} retries={result['transaction_retries']}"
+    )
+
+
+def compare_to_baseline(report, baseline, threshold):
+    """
+    Prints p95 and req/s changes against a baseline report and returns the
+    number of endpoints that regressed by more than threshold (a fraction).
+    """
+    baseline_results = {
+        (result['dataset_tickets'], result['endpoint']): result for result in baseline['results']
+    }
+    regressions = 0
+    for result in report['results']:
+        previous = baseline_results.get((result['dataset_tickets'], result['endpoint']))
+        if previous is None:
+            continue
+        p95_change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0.0
+        throughput_change = (result['req_per_s'] - previous['req_per_s']) / previous['req_per_s'] if previous['req_per_s'] else 0.0
+        regressed = p95_change > threshold or throughput_change < -threshold
+        regressions += regressed
+        print(
+            f"{result['dataset_tickets']:>8} tickets  {result['endpoint']:<22} "
+            f"p95 {previous['p95_ms']} -> {result['p95_ms']}ms ({p95_change:+.0%})  "
+            f"req/s {previous['req_per_s']} -> {result['req_per_s']} ({throughput_change:+.0%})"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', default='1000,100000', help='comma-separated ticket counts to seed, e.g. 1000,100000,1000000')
+    parser.add_argument('--endpoints', help='comma-separated scenario names to run (default: all)')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent worker threads')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint per dataset')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per endpoint; the median run (by p95) is reported')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated latency per Firestore RPC')
+    parser.add_argument('--block-size', type=int, default=ticketing_app.TICKET_ID_BLOCK_SIZE, help='display ID block size')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for datasets and requests')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--json', action='store_true', help='print the JSON report to stdout')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p95/req/s change counted as a regression (fraction)')
+    parser.add_argument('--verbose', action='store_true', help="keep the app's own log output")
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.endpoints:
+        names = args.endpoints.split(',')
+        unknown = set(names) - {name for name, _, _ in SCENARIOS}
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in SCENARIOS if scenario[0] in names]
+
+    report = {
+        'benchmark': 'bench_endpoints',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'workers': args.workers,
+            'requests': args.requests,
+            'repeat': args.repeat,
+            'latency_ms': args.latency_ms,
+            'block_size': args.block_size,
+            'seed': args.seed,
+        },
+        'datasets': [],
+        'results': [],
+    }
+    with contextlib.ExitStack() as stack:
+        # The app logs every write; keep that out of the report unless asked for
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        for ticket_count in [int(count) for count in args.datasets.split(',')]:
+            dataset, results = run_dataset(ticket_count, scenarios, args)
+            report['datasets'].append(dataset)
+            report['results'].extend(results)
+    report['max_rss_mb'] = to_mb(max_rss_bytes())
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{regressions} endpoint(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark ticket creation throughput under concurrent workers.
+
+Drives POST /create through the Flask test client from N worker threads
+against the in-memory Firestore stand-in, once per display ID block size, and
+reports creates/s, latency percentiles, counter transaction retries and
+whether every display ID was unique. Each worker has its own display ID
+allocator, as a separate server process would, so workers contend on the
+counter document. Block size 1 reproduces the old
+one-counter-transaction-per-ticket behaviour.
+
+Usage (from it_ticketing_tool/):
+    python benchmarks/bench_ticket_ids.py --workers 16 --block-sizes 1,10,50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as ticketing_app  # noqa: E402
+import fake_firestore  # noqa: E402
+import metrics  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def use_fake_database(latency):
+    """
+    Points the app module at a fresh in-memory database, instrumented the same
+    way as the real client. Returns the (uninstrumented) fake.
+    """
+    fake_db = fake_firestore.FakeFirestore(latency=latency)
+    ticketing_app.db = metrics.instrument_firestore(fake_db)
+    ticketing_app.firestore = fake_firestore
+    ticketing_app.users_collection = ticketing_app.db.collection('users')
+    ticketing_app.tickets_collection = ticketing_app.db.collection('tickets')
+    ticketing_app.db_connected = True
+    # Benchmarks reconcile explicitly; a background scan would skew the timings
+    ticketing_app.COUNTER_RECONCILE_INTERVAL = 0
+    return fake_db
+
+
+class PerWorkerAllocator:
+    """
+    Stands in for app.ticket_id_allocator and gives every worker thread its own
+    TicketIdAllocator, the way separate server processes each have one.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._local = threading.local()
+        self._allocators = []
+        self._lock = threading.Lock()
+
+    def next_display_id(self):
+        allocator = getattr(self._local, 'allocator', None)
+        if allocator is None:
+            allocator = ticketing_app.TicketIdAllocator(self.block_size)
+            self._local.allocator = allocator
+            with self._lock:
+                self._allocators.append(allocator)
+        return allocator.next_display_id()
+
+    @property
+    def blocks_reserved(self):
+        return sum(allocator.blocks_reserved for allocator in self._allocators)
+
+
+def run_create_benchmark(workers, tickets_per_worker, block_size, latency):
+    fake_db = use_fake_database(latency)
+    ticketing_app.ticket_id_allocator = PerWorkerAllocator(block_size)
+    client = ticketing_app.app.test_client()
+
+    latencies = []
+    display_ids = []
+    errors = []
+    results_lock = threading.Lock()
+    start_barrier = threading.Barrier(workers)
+
+    def worker(worker_index):
+        start_barrier.wait()
+        for ticket_index in range(tickets_per_worker):
+            started = time.perf_counter()
+            response = client.post('/create', json={
+                'title': f'Benchmark ticket {worker_index}-{ticket_index}',
+                'description': 'Created by bench_ticket_ids.py',
+                'reporter': f'worker-{worker_index}',
+                'creator_uid': f'uid-{worker_index}',
+                'creator_email': f'worker-{worker_index}@example.com',
+            })
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                if response.status_code == 201:
+                    latencies.append(elapsed)
+                    display_ids.append(response.get_json()['display_id'])
+                else:
+                    errors.append(response.get_json().get('error'))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'workers': workers,
+        'block_size': block_size,
+        'latency_ms': latency * 1000,
+        'created': len(display_ids),
+        'errors': len(errors),
+        'creates_per_second': round(len(display_ids) / wall_time, 1) if wall_time else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'blocks_reserved': ticketing_app.ticket_id_allocator.blocks_reserved,
+        'transaction_retries': fake_db.stats['transaction_retries'],
+        'unique_display_ids': len(set(display_ids)) == len(display_ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent worker threads')
+    parser.add_argument('--tickets-per-worker', type=int, default=100)
+    parser.add_argument('--block-sizes', default='1,10,50', help='comma-separated display ID block sizes')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated latency per Firestore RPC')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    for block_size in [int(size) for size in args.block_sizes.split(',')]:
+        result = run_create_benchmark(
+            args.workers, args.tickets_per_worker, block_size, args.latency_ms / 1000
+        )
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(
+                f"block_size={result['block_size']:>4} "
+                f"created={result['created']} errors={result['errors']} "
+                f"{result['creates_per_second']:>8} creates/s  "
+                f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms  "
+                f"blocks={result['blocks_reserved']} retries={result['transaction_retries']} "
+                f"unique={result['unique_display_ids']}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,723 @@
+"""
+In-memory stand-in for the parts of the Firestore client API that app.py uses.
+
+It is a drop-in replacement for both the client ('db') and the
+'firebase_admin.firestore' module ('firestore') so the Flask app can be
+benchmarked without a Firebase project or emulator:
+
+    fake_db = FakeFirestore(latency=0.002)
+    app.db = fake_db
+    app.firestore = fake_firestore_module
+
+Transactions use optimistic concurrency: documents read in a transaction are
+version-checked at commit time and the transaction is retried on conflict, so
+hot documents show up as retries just like they do against real Firestore.
+Every simulated RPC (document get, query, commit) sleeps for 'latency' seconds.
+
+Queries support where/order_by/select/limit/start_after/stream and
+on_snapshot. Like real Firestore they are served from sorted indexes (one per
+combination of equality filters and sort order, built on first use and kept up
+to date by every write), so a page read costs about the same against 1k or 1M
+documents. Documents missing an order_by or equality field are left out of the
+results, as they are by Firestore.
+"""
+import bisect
+import copy
+import enum
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions as google_exceptions
+
+
+class Aborted(google_exceptions.Aborted):
+    """Raised when a transaction commit conflicts with a concurrent write."""
+
+
+class NotFound(Exception):
+    """Raised when updating a document that does not exist."""
+
+
+class Increment:
+    """Server-side numeric increment sentinel (mirrors firestore.Increment)."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class ArrayUnion:
+    """Server-side array union sentinel (mirrors firestore.ArrayUnion)."""
+
+    def __init__(self, values):
+        self.values = list(values)
+
+
+class _Sentinel:
+    """Special write value (mirrors firestore.DELETE_FIELD)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+DELETE_FIELD = _Sentinel('DELETE_FIELD')
+
+# Values that can be shared between snapshots instead of deep-copied
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None), datetime)
+
+
+def _copy_value(value):
+    """Copies stored data for a caller; much cheaper than deepcopy for documents."""
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    return copy.deepcopy(value)
+
+
+def _resolve_value(current, value):
+    """Applies a (possibly sentinel) value on top of the current stored value."""
+    if isinstance(value, Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in result:
+                result.append(copy.deepcopy(item))
+        return result
+    if isinstance(value, dict):
+        return {key: _resolve_value(None, item) for key, item in value.items() if item is not DELETE_FIELD}
+    return _copy_value(value)
+
+
+def _merge_into(target, data):
+    """Deep-merges data into target in place, resolving sentinels."""
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_into(target[key], value)
+        else:
+            target[key] = _resolve_value(target.get(key), value)
+
+
+def _get_nested(data, field_path):
+    """Reads a dotted field path from a nested dict, raising KeyError if missing."""
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _field_value(doc_id, data, field_path):
+    """Reads a field for filtering/ordering; '__name__' is the document ID."""
+    if field_path == '__name__':
+        return doc_id
+    return _get_nested(data, field_path)
+
+
+def _sort_key(value):
+    """Maps a value to a key ordered like Firestore orders mixed value types."""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, DocumentReference):
+        return (6, value.path)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_sort_key(item) for item in value))
+    if isinstance(value, dict):
+        return (9, tuple((key, _sort_key(item)) for key, item in sorted(value.items())))
+    return (7, repr(value))
+
+
+# Sorts after every _sort_key(); used as an open upper bound when bisecting
+_MAX_KEY = (99,)
+
+
+def _matches_filter(doc_id, data, field_path, op_string, value):
+    try:
+        actual = _field_value(doc_id, data, field_path)
+    except KeyError:
+        return False
+    actual_key = _sort_key(actual)
+    if op_string == '==':
+        return actual_key == _sort_key(value)
+    if op_string == '!=':
+        return actual is not None and actual_key != _sort_key(value)
+    if op_string in ('<', '<=', '>', '>='):
+        value_key = _sort_key(value)
+        # Range filters only match values of the same type
+        if actual_key[0] != value_key[0]:
+            return False
+        return {
+            '<': actual_key < value_key,
+            '<=': actual_key <= value_key,
+            '>': actual_key > value_key,
+            '>=': actual_key >= value_key,
+        }[op_string]
+    if op_string == 'in':
+        return actual_key in {_sort_key(item) for item in value}
+    if op_string == 'not-in':
+        return actual is not None and actual_key not in {_sort_key(item) for item in value}
+    if op_string == 'array_contains':
+        return isinstance(actual, list) and _sort_key(value) in {_sort_key(item) for item in actual}
+    if op_string == 'array_contains_any':
+        wanted = {_sort_key(item) for item in value}
+        return isinstance(actual, list) and any(_sort_key(item) in wanted for item in actual)
+    raise ValueError(f"Unsupported filter operator: {op_string}")
+
+
+def _project(data, field_paths):
+    """Returns only the given (possibly dotted) fields of data."""
+    result = {}
+    for field_path in field_paths:
+        try:
+            value = _get_nested(data, field_path)
+        except KeyError:
+            continue
+        target = result
+        parts = field_path.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = _copy_value(value)
+    return result
+
+
+class DocumentSnapshot:
+    """Point-in-time copy of a document."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return _copy_value(self._data)
+
+    def get(self, field_path):
+        return _copy_value(_get_nested(self._data or {}, field_path))
+
+
+class DocumentReference:
+    """Reference to a single document in the fake database."""
+
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self.id = doc_id
+        self.path = f'{collection_path}/{doc_id}'
+        self._collection_path = collection_path
+
+    def collection(self, name):
+        return CollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, transaction=None):
+        if transaction is not None:
+            return transaction.get(self)
+        self._client._simulate_rpc()
+        with self._client._lock:
+            return self._client._snapshot(self)
+
+    def set(self, data, merge=False):
+        self._client._commit([('set', self, data, merge)], {})
+
+    def update(self, data):
+        self._client._commit([('update', self, data, False)], {})
+
+    def delete(self):
+        self._client._commit([('delete', self, None, False)], {})
+
+
+class Query:
+    """
+    Immutable query over one (sub)collection; every builder method returns a
+    new Query, mirroring firestore.Query.
+    """
+
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client, path, filters=(), orders=(), projection=None, limit=None, cursor=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._projection = projection
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        fields = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'projection': self._projection,
+            'limit': self._limit,
+            'cursor': self._cursor,
+        }
+        fields.update(changes)
+        return Query(self._client, self._path, **fields)
+
+    def where(self, field_path, op_string, value):
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields):
+        return self._copy(cursor=document_fields)
+
+    def stream(self, transaction=None):
+        self._client._simulate_rpc()
+        with self._client._lock:
+            snapshots = self._client._run_query(self)
+        for snapshot in snapshots:
+            yield snapshot
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction))
+
+    def on_snapshot(self, callback):
+        return Watch(self, callback)
+
+    def _normalized_orders(self):
+        """Sort order with the implicit trailing '__name__' tie-breaker."""
+        orders = list(self._orders) or [('__name__', self.ASCENDING)]
+        if orders[-1][0] != '__name__':
+            orders.append(('__name__', orders[-1][1]))
+        return orders
+
+    def _matches(self, doc_id, data):
+        return all(_matches_filter(doc_id, data, *query_filter) for query_filter in self._filters)
+
+    def _cursor_values(self, orders):
+        """Returns the start_after cursor as one value per order field."""
+        cursor = self._cursor
+        if isinstance(cursor, DocumentSnapshot):
+            return [cursor.id if field == '__name__' else cursor.get(field) for field, _ in orders]
+        values = []
+        for field, _ in orders:
+            value = cursor[field]
+            values.append(value.id if isinstance(value, DocumentReference) else value)
+        return values
+
+
+class CollectionReference(Query):
+    """Reference to a (sub)collection in the fake database."""
+
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, doc_id=None):
+        return DocumentReference(self._client, self.path, doc_id or uuid.uuid4().hex[:20])
+
+
+ChangeType = enum.Enum('ChangeType', ['ADDED', 'REMOVED', 'MODIFIED'])
+
+
+class DocumentChange:
+    """One document change delivered to an on_snapshot callback."""
+
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class Watch:
+    """
+    Snapshot listener returned by Query.on_snapshot. Filters are applied but
+    order_by/limit are ignored. Like the real client, the callback runs on a
+    separate thread: first with every matching document as ADDED, then once
+    per commit that changes the result set.
+    """
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._events = queue.Queue()
+        self._documents = {}
+        client = query._client
+        with client._lock:
+            changes = []
+            for doc_id, data in client._collections.get(query._path, {}).items():
+                if query._matches(doc_id, data):
+                    snapshot = DocumentSnapshot(DocumentReference(client, query._path, doc_id), _copy_value(data))
+                    self._documents[doc_id] = snapshot
+                    changes.append(DocumentChange(ChangeType.ADDED, snapshot))
+            client.stats['reads'] += max(len(changes), 1)
+            self._events.put((list(self._documents.values()), changes))
+            client._watches.add(self)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _on_write(self, reference, data):
+        """Called by the client (holding its lock) after a document changes."""
+        if reference._collection_path != self._query._path:
+            return None
+        matched = reference.id in self._documents
+        matches = data is not None and self._query._matches(reference.id, data)
+        if not matched and not matches:
+            return None
+        snapshot = DocumentSnapshot(reference, _copy_value(data) if matches else None)
+        if matches:
+            self._documents[reference.id] = snapshot
+            return DocumentChange(ChangeType.MODIFIED if matched else ChangeType.ADDED, snapshot)
+        return DocumentChange(ChangeType.REMOVED, self._documents.pop(reference.id))
+
+    def _run(self):
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            docs, changes = item
+            self._callback(docs, changes, datetime.now(timezone.utc))
+
+    def unsubscribe(self):
+        with self._query._client._lock:
+            self._query._client._watches.discard(self)
+        self._events.put(None)
+
+
+class WriteBatch:
+    """Collects writes and applies them atomically on commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(('set', reference, data, merge))
+
+    def update(self, reference, data):
+        self._writes.append(('update', reference, data, False))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._client._commit(writes, {})
+
+
+class Transaction(WriteBatch):
+    """Optimistic transaction: reads are version-checked when committing."""
+
+    def __init__(self, client, max_attempts=5):
+        super().__init__(client)
+        self.max_attempts = max_attempts
+        self._read_versions = {}
+
+    def get(self, reference):
+        self._client._simulate_rpc()
+        with self._client._lock:
+            self._read_versions[reference.path] = self._client._versions.get(reference.path, 0)
+            return self._client._snapshot(reference)
+
+    def get_all(self, references):
+        self._client._simulate_rpc()
+        with self._client._lock:
+            snapshots = []
+            for reference in references:
+                self._read_versions[reference.path] = self._client._versions.get(reference.path, 0)
+                snapshots.append(self._client._snapshot(reference))
+        for snapshot in snapshots:
+            yield snapshot
+
+    def _begin(self):
+        self._writes = []
+        self._read_versions = {}
+
+    def _commit(self):
+        writes, self._writes = self._writes, []
+        self._client._commit(writes, self._read_versions)
+
+
+def transactional(func):
+    """
+    Mirrors firestore.transactional: runs func and retries it on commit
+    conflicts, raising ValueError (from the last Aborted) once out of attempts.
+    """
+    def wrapper(transaction, *args, **kwargs):
+        last_error = None
+        for attempt in range(transaction.max_attempts):
+            transaction._begin()
+            result = func(transaction, *args, **kwargs)
+            try:
+                transaction._commit()
+                return result
+            except Aborted as e:
+                last_error = e
+                transaction._client._count('transaction_retries')
+        raise ValueError(f"Failed to commit transaction in {transaction.max_attempts} attempts.") from last_error
+    return wrapper
+
+
+class FakeFirestore:
+    """In-memory Firestore client with injectable per-RPC latency."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.stats = {'reads': 0, 'writes': 0, 'commits': 0, 'transaction_retries': 0}
+        self._lock = threading.Lock()
+        self._collections = {}
+        self._versions = {}
+        # collection path -> {(equality fields, order fields): sorted index keys}
+        self._indexes = {}
+        self._watches = set()
+
+    def _simulate_rpc(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _snapshot(self, reference):
+        """Returns a snapshot of the stored document (caller handles locking)."""
+        data = self._collections.get(reference._collection_path, {}).get(reference.id)
+        self.stats['reads'] += 1
+        return DocumentSnapshot(reference, _copy_value(data))
+
+    def _commit(self, writes, read_versions):
+        self._simulate_rpc()
+        with self._lock:
+            for path, version in read_versions.items():
+                if self._versions.get(path, 0) != version:
+                    raise Aborted(f"Document {path} changed during the transaction")
+            # Commits are all-or-nothing: check update targets before applying anything
+            for kind, reference, data, merge in writes:
+                if kind == 'update' and reference.id not in self._collections.get(reference._collection_path, {}):
+                    raise NotFound(f"No document to update: {reference.path}")
+            for kind, reference, data, merge in writes:
+                self._apply_write(kind, reference, data, merge)
+            self.stats['commits'] += 1
+            self.stats['writes'] += len(writes)
+            if self._watches:
+                self._notify_watches(writes)
+
+    def _apply_write(self, kind, reference, data, merge):
+        documents = self._collections.setdefault(reference._collection_path, {})
+        current = documents.get(reference.id)
+        indexes = self._indexes.get(reference._collection_path, {})
+        # Updates modify the stored dict in place, so take the old index keys first
+        old_keys = [
+            _index_key(eq_fields, order_fields, reference.id, current)
+            for eq_fields, order_fields in indexes
+        ]
+
+        if kind == 'delete':
+            documents.pop(reference.id, None)
+        elif kind == 'set':
+            new_data = _copy_value(current) if merge and current is not None else {}
+            _merge_into(new_data, data)
+            documents[reference.id] = new_data
+        else:
+            for field_path, value in data.items():
+                target = current
+                parts = field_path.split('.')
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                if value is DELETE_FIELD:
+                    target.pop(parts[-1], None)
+                else:
+                    target[parts[-1]] = _resolve_value(target.get(parts[-1]), value)
+        self._versions[reference.path] = self._versions.get(reference.path, 0) + 1
+
+        new_data = documents.get(reference.id)
+        for ((eq_fields, order_fields), index), old_key in zip(indexes.items(), old_keys):
+            new_key = _index_key(eq_fields, order_fields, reference.id, new_data)
+            if new_key == old_key:
+                continue
+            if old_key is not None:
+                del index[bisect.bisect_left(index, old_key)]
+            if new_key is not None:
+                bisect.insort(index, new_key)
+
+    def _notify_watches(self, writes):
+        changes_by_watch = {}
+        for kind, reference, data, merge in writes:
+            data = self._collections.get(reference._collection_path, {}).get(reference.id)
+            for watch in self._watches:
+                change = watch._on_write(reference, data)
+                if change is not None:
+                    changes_by_watch.setdefault(watch, []).append(change)
+        for watch, changes in changes_by_watch.items():
+            self.stats['reads'] += len(changes)
+            watch._events.put((list(watch._documents.values()), changes))
+
+    def _index(self, path, eq_fields, order_fields):
+        """Returns the sorted index for a query shape, building it on first use."""
+        indexes = self._indexes.setdefault(path, {})
+        index = indexes.get((eq_fields, order_fields))
+        if index is None:
+            index = []
+            for doc_id, data in self._collections.get(path, {}).items():
+                key = _index_key(eq_fields, order_fields, doc_id, data)
+                if key is not None:
+                    index.append(key)
+            index.sort()
+            indexes[(eq_fields, order_fields)] = index
+        return index
+
+    def _run_query(self, query):
+        """Returns the snapshots a query matches (caller holds the lock)."""
+        documents = self._collections.get(query._path, {})
+        orders = query._normalized_orders()
+        if len({direction for _, direction in orders}) == 1:
+            doc_ids = self._scan_index(query, orders)
+        else:
+            doc_ids = self._scan_and_sort(query, orders, documents)
+
+        snapshots = []
+        for doc_id in doc_ids:
+            data = documents[doc_id]
+            if query._projection is not None:
+                data = _project(data, query._projection)
+            else:
+                data = _copy_value(data)
+            snapshots.append(DocumentSnapshot(DocumentReference(self, query._path, doc_id), data))
+        # A query is billed at least one read even when it matches nothing
+        self.stats['reads'] += max(len(snapshots), 1)
+        return snapshots
+
+    def _scan_index(self, query, orders):
+        """Serves a query whose order_by clauses all share one direction from an index."""
+        eq_values = {}
+        for field_path, op_string, value in query._filters:
+            if op_string == '==' and field_path not in eq_values:
+                eq_values[field_path] = value
+        eq_fields = tuple(sorted(eq_values))
+        order_fields = tuple(field for field, _ in orders)
+        index = self._index(query._path, eq_fields, order_fields)
+
+        prefix = tuple(_sort_key(eq_values[field]) for field in eq_fields)
+        low = bisect.bisect_left(index, prefix)
+        high = bisect.bisect_left(index, prefix + (_MAX_KEY,))
+        # Range filters on the first sort field narrow the scan
+        for field_path, op_string, value in query._filters:
+            if field_path != order_fields[0]:
+                continue
+            bound = prefix + (_sort_key(value),)
+            if op_string == '>=':
+                low = max(low, bisect.bisect_left(index, bound))
+            elif op_string == '>':
+                low = max(low, bisect.bisect_left(index, bound + (_MAX_KEY,)))
+            elif op_string == '<':
+                high = min(high, bisect.bisect_left(index, bound))
+            elif op_string == '<=':
+                high = min(high, bisect.bisect_left(index, bound + (_MAX_KEY,)))
+
+        descending = orders[0][1] == Query.DESCENDING
+        if query._cursor is not None:
+            cursor_key = prefix + tuple(_sort_key(value) for value in query._cursor_values(orders))
+            if descending:
+                high = min(high, bisect.bisect_left(index, cursor_key))
+            else:
+                low = max(low, bisect.bisect_right(index, cursor_key))
+
+        positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+        documents = self._collections.get(query._path, {})
+        doc_ids = []
+        for position in positions:
+            doc_id = index[position][-1][1]
+            if query._matches(doc_id, documents[doc_id]):
+                doc_ids.append(doc_id)
+                if query._limit is not None and len(doc_ids) >= query._limit:
+                    break
+        return doc_ids
+
+    def _scan_and_sort(self, query, orders, documents):
+        """Serves a query with mixed sort directions by sorting every match."""
+        matched = []
+        for doc_id, data in documents.items():
+            if not query._matches(doc_id, data):
+                continue
+            try:
+                values = [_sort_key(_field_value(doc_id, data, field)) for field, _ in orders]
+            except KeyError:
+                continue
+            matched.append((values, doc_id))
+        for position in range(len(orders) - 1, -1, -1):
+            matched.sort(key=lambda item: item[0][position], reverse=orders[position][1] == Query.DESCENDING)
+
+        if query._cursor is not None:
+            cursor_values = [_sort_key(value) for value in query._cursor_values(orders)]
+            matched = [item for item in matched if _is_after_cursor(item[0], cursor_values, orders)]
+        if query._limit is not None:
+            matched = matched[:query._limit]
+        return [doc_id for _, doc_id in matched]
+
+    def seed(self, path, documents):
+        """
+        Bulk-loads (doc_id, data) pairs into a collection without latency,
+        write stats or listener notifications; for preparing benchmark datasets.
+        """
+        with self._lock:
+            collection = self._collections.setdefault(path, {})
+            for doc_id, data in documents:
+                collection[doc_id] = data
+            # Indexes over this collection are rebuilt on next use
+            self._indexes.pop(path, None)
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def transaction(self, max_attempts=5):
+        return Transaction(self, max_attempts)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, transaction=None):
+        self._simulate_rpc()
+        with self._lock:
+            snapshots = [self._snapshot(reference) for reference in references]
+        for snapshot in snapshots:
+            yield snapshot
+
+
+def _index_key(eq_fields, order_fields, doc_id, data):
+    """
+    Returns a document's key in an index: its equality field values, then its
+    sort field values (the last being '__name__'), or None if a field is missing.
+    """
+    if data is None:
+        return None
+    try:
+        return tuple(_sort_key(_field_value(doc_id, data, field)) for field in eq_fields + order_fields)
+    except KeyError:
+        return None
+
+
+def _is_after_cursor(values, cursor_values, orders):
+    """Whether sort values come strictly after a start_after cursor."""
+    for value, cursor_value, (_, direction) in zip(values, cursor_values, orders):
+        if value != cursor_value:
+            return (value < cursor_value) if direction == Query.DESCENDING else (value > cursor_value)
+    return False
@@ -0,0 +1,347 @@
+"""
+Per-request performance instrumentation for the ticketing API.
+
+- Request latency histograms per route, method and status code.
+- Firestore document reads, writes and transaction retries, counted by
+  wrapping the Firestore client, collections, queries, documents, batches and
+  transactions in thin proxies (see instrument_firestore).
+- Prometheus text exposition of everything above (render_prometheus).
+- Per-request totals and query shapes, used for the slow-request log.
+
+Counts are recorded against the route of the request that triggered them;
+Firestore work done outside a request (background jobs) is recorded under the
+route label 'background'. Worker threads started by a request must run in a
+copy of its context (contextvars.copy_context().run) to be attributed to it.
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store for request latency histograms and Firestore counters.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self._latency = {} # (method, route, status) -> [bucket counts..., sum, count]
+        self._counters = {} # (metric name, route) -> value
+
+    def observe_request(self, method, route, status, seconds):
+        key = (method, route, str(status))
+        with self._lock:
+            series = self._latency.get(key)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._latency[key] = series
+            for index, upper_bound in enumerate(self.buckets):
+                if seconds <= upper_bound:
+                    series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def increment(self, name, route, amount=1):
+        if not amount:
+            return
+        key = (name, route)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render_prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            latency = {key: list(series) for key, series in self._latency.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route, method and status code.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, route, status), series in sorted(latency.items()):
+            labels = f'method="{_escape(method)}",route="{_escape(route)}",status="{status}"'
+            for index, upper_bound in enumerate(self.buckets):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{upper_bound}"}} {series[index]}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {series[-1]}')
+
+        for name, help_text in FIRESTORE_COUNTERS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (counter_name, route), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f'{name}{{route="{_escape(route)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+FIRESTORE_COUNTERS = [
+    ('firestore_document_reads_total', 'Firestore documents read, by route.'),
+    ('firestore_document_writes_total', 'Firestore document writes committed, by route.'),
+    ('firestore_transaction_retries_total', 'Firestore transaction attempts retried after a conflict, by route.'),
+]
+
+# Per-request stat key -> Prometheus counter name
+STAT_METRIC_NAMES = {
+    'reads': 'firestore_document_reads_total',
+    'writes': 'firestore_document_writes_total',
+    'transaction_retries': 'firestore_transaction_retries_total',
+}
+
+registry = MetricsRegistry()
+
+# Guards per-request stats, which a request's worker threads update concurrently
+_request_stats_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def current_route():
+    """
+    Returns the route label for the current request ('background' outside one).
+    """
+    if not has_request_context():
+        return 'background'
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def _request_stats():
+    return g.get('firestore_stats') if has_request_context() else None
+
+
+def start_request():
+    """
+    Resets the per-request counters; call from a before_request hook.
+    """
+    g.request_started_at = time.perf_counter()
+    g.firestore_stats = {'reads': 0, 'writes': 0, 'transaction_retries': 0, 'queries': []}
+
+
+def finish_request(response):
+    """
+    Records the request's latency and returns (seconds, per-request stats);
+    call from an after_request hook.
+    """
+    seconds = time.perf_counter() - g.get('request_started_at', time.perf_counter())
+    registry.observe_request(request.method, current_route(), response.status_code, seconds)
+    return seconds, g.get('firestore_stats')
+
+
+def record(stat, amount):
+    """
+    Adds amount to a Firestore counter for the current route and request.
+    """
+    registry.increment(STAT_METRIC_NAMES[stat], current_route(), amount)
+    stats = _request_stats()
+    if stats is not None:
+        with _request_stats_lock:
+            stats[stat] += amount
+
+
+def record_query(shape):
+    stats = _request_stats()
+    if stats is not None:
+        with _request_stats_lock:
+            stats['queries'].append(shape)
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, _Proxy) else value
+
+
+class _Proxy:
+    """Forwards every attribute not overridden by a subclass to the wrapped object."""
+
+    def __init__(self, target):
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+class InstrumentedQuery(_Proxy):
+    """Wraps a Query or CollectionReference, tracking its shape and counting reads."""
+
+    def __init__(self, target, shape):
+        super().__init__(target)
+        object.__setattr__(self, '_shape', shape)
+
+    def _derive(self, query, clause):
+        return InstrumentedQuery(query, f'{self._shape} {clause}')
+
+    def where(self, field_path, op_string, value):
+        return self._derive(self._target.where(field_path, op_string, value), f'where {field_path} {op_string}')
+
+    def order_by(self, field_path, direction=None, **kwargs):
+        if direction is not None:
+            kwargs['direction'] = direction
+        return self._derive(self._target.order_by(field_path, **kwargs), f'order_by {field_path} {kwargs.get("direction", "")}'.rstrip())
+
+    def select(self, field_paths):
+        field_paths = list(field_paths)
+        return self._derive(self._target.select(field_paths), f'select({len(field_paths)} fields)')
+
+    def limit(self, count):
+        return self._derive(self._target.limit(count), f'limit {count}')
+
+    def start_after(self, document_fields):
+        return self._derive(self._target.start_after(_unwrap(document_fields)), 'start_after')
+
+    def stream(self, *args, **kwargs):
+        record_query(self._shape)
+        docs_read = 0
+        try:
+            for doc in self._target.stream(*args, **kwargs):
+                docs_read += 1
+                yield doc
+        finally:
+            # A query costs at least one read even when it matches nothing
+            record('reads', max(docs_read, 1))
+
+    def on_snapshot(self, callback):
+        def counting_callback(docs, changes, read_time):
+            # Listeners are billed one read per changed document
+            record('reads', len(changes))
+            return callback(docs, changes, read_time)
+        return self._target.on_snapshot(counting_callback)
+
+    def document(self, *args):
+        return InstrumentedDocument(self._target.document(*args))
+
+
+class InstrumentedDocument(_Proxy):
+    """Wraps a DocumentReference, counting reads and writes."""
+
+    def get(self, *args, **kwargs):
+        if 'transaction' in kwargs:
+            kwargs['transaction'] = _unwrap(kwargs['transaction'])
+        snapshot = self._target.get(*args, **kwargs)
+        record('reads', 1)
+        return snapshot
+
+    def set(self, *args, **kwargs):
+        result = self._target.set(*args, **kwargs)
+        record('writes', 1)
+        return result
+
+    def update(self, *args, **kwargs):
+        result = self._target.update(*args, **kwargs)
+        record('writes', 1)
+        return result
+
+    def delete(self, *args, **kwargs):
+        result = self._target.delete(*args, **kwargs)
+        record('writes', 1)
+        return result
+
+    def collection(self, name):
+        return InstrumentedQuery(self._target.collection(name), f'{self._target.path}/{name}')
+
+
+class InstrumentedWriteBatch(_Proxy):
+    """Wraps a WriteBatch; writes are counted when the batch commits."""
+
+    def __init__(self, target):
+        super().__init__(target)
+        object.__setattr__(self, '_pending_writes', 0)
+
+    def _queue_write(self, method, reference, *args, **kwargs):
+        result = getattr(self._target, method)(_unwrap(reference), *args, **kwargs)
+        object.__setattr__(self, '_pending_writes', self._pending_writes + 1)
+        return result
+
+    def set(self, reference, *args, **kwargs):
+        return self._queue_write('set', reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._queue_write('update', reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._queue_write('delete', reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        result = self._target.commit(*args, **kwargs)
+        record('writes', self._pending_writes)
+        object.__setattr__(self, '_pending_writes', 0)
+        return result
+
+
+class InstrumentedTransaction(InstrumentedWriteBatch):
+    """
+    Wraps a Transaction. Every attempt of a @firestore.transactional function
+    begins the transaction again, so attempts after the first count as retries.
+    """
+
+    def __init__(self, target):
+        super().__init__(target)
+        object.__setattr__(self, '_attempts', 0)
+
+    def get(self, reference, *args, **kwargs):
+        result = self._target.get(_unwrap(reference), *args, **kwargs)
+        record('reads', 1)
+        return result
+
+    def get_all(self, references, *args, **kwargs):
+        docs_read = 0
+        try:
+            for doc in self._target.get_all([_unwrap(reference) for reference in references], *args, **kwargs):
+                docs_read += 1
+                yield doc
+        finally:
+            record('reads', docs_read)
+
+    def _begin(self, *args, **kwargs):
+        object.__setattr__(self, '_attempts', self._attempts + 1)
+        object.__setattr__(self, '_pending_writes', 0)
+        if self._attempts > 1:
+            record('transaction_retries', 1)
+        return self._target._begin(*args, **kwargs)
+
+    def _commit(self, *args, **kwargs):
+        result = self._target._commit(*args, **kwargs)
+        record('writes', self._pending_writes)
+        object.__setattr__(self, '_pending_writes', 0)
+        return result
+
+
+class InstrumentedClient(_Proxy):
+    """Wraps the Firestore client so every handle derived from it is instrumented."""
+
+    def collection(self, name):
+        return InstrumentedQuery(self._target.collection(name), name)
+
+    def transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._target.transaction(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return InstrumentedWriteBatch(self._target.batch(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        docs_read = 0
+        try:
+            for doc in self._target.get_all([_unwrap(reference) for reference in references], *args, **kwargs):
+                docs_read += 1
+                yield doc
+        finally:
+            record('reads', docs_read)
+
+
+def instrument_firestore(client):
+    """
+    Returns an instrumented proxy for a Firestore client (real or fake).
+    """
+    return InstrumentedClient(client)
@@ -0,0 +1,142 @@
+"""
+Migration: copies each ticket's embedded 'comments' array into the ticket's
+'comments' subcollection.
+
+For every ticket whose 'comments' array has entries not copied yet, those
+comments are written as subcollection documents with deterministic IDs
+('legacy-<array index>'), 'comment_count' is incremented by the number of
+copied comments, 'comments_migrated' records how much of the array has been
+copied and 'last_replier' is filled in if the ticket does not have one yet.
+A ticket's writes are committed in the same batch whenever they fit in one, so
+it is safe to stop and re-run the migration at any point.
+
+The array itself is kept by default: the Node backend
+(ticketing-tool-backend/server.js, add_comment and GET /ticket/:ticket_id) and
+the React UI still read and append to it. Re-running the migration copies
+comments appended there since the last run. Pass --delete-embedded to remove
+the arrays once those clients read the subcollection instead.
+
+Usage (from it_ticketing_tool/):
+    python migrate_comments.py --dry-run
+    python migrate_comments.py --page-size 200
+    python migrate_comments.py --delete-embedded
+"""
+import argparse
+
+from firebase_admin import firestore
+
+import app
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+
+def iter_tickets_with_comments(page_size, delete_embedded=False):
+    """
+    Yields (ticket_ref, ticket_data) for tickets with embedded comments that
+    still need migrating (with delete_embedded, every ticket that still has
+    the array), reading the tickets collection in pages ordered by document ID.
+    """
+    last_doc_id = None
+    while True:
+        query = app.tickets_collection.select(['comments', 'comments_migrated', 'last_replier']).order_by('__name__').limit(page_size)
+        if last_doc_id:
+            query = query.start_after({'__name__': last_doc_id})
+        docs = list(query.stream())
+        for doc in docs:
+            ticket_data = doc.to_dict()
+            comments = ticket_data.get('comments')
+            if comments and (delete_embedded or len(comments) > ticket_data.get('comments_migrated', 0)):
+                yield doc.reference, ticket_data
+        if len(docs) < page_size:
+            return
+        last_doc_id = docs[-1].id
+
+
+def ticket_migration_writes(ticket_ref, ticket_data, delete_embedded=False):
+    """
+    Returns the list of (kind, reference, data) writes that migrate one ticket:
+    the array entries from 'comments_migrated' onwards (the array is only ever
+    appended to), then the ticket update, which is always the last write.
+    """
+    embedded_comments = ticket_data['comments']
+    already_migrated = ticket_data.get('comments_migrated', 0)
+    comments = []
+    writes = []
+    for index, comment in enumerate(embedded_comments):
+        if index < already_migrated or not isinstance(comment, dict):
+            continue
+        comment_ref = ticket_ref.collection('comments').document(f'legacy-{index:05d}')
+        writes.append(('set', comment_ref, comment))
+        comments.append(comment)
+
+    ticket_update = {'comment_count': firestore.Increment(len(comments))}
+    if delete_embedded:
+        ticket_update['comments'] = firestore.DELETE_FIELD
+        ticket_update['comments_migrated'] = firestore.DELETE_FIELD
+    else:
+        ticket_update['comments_migrated'] = len(embedded_comments)
+    if comments and not ticket_data.get('last_replier'):
+        latest_comment = max(comments, key=lambda comment: str(comment.get('timestamp', '')))
+        ticket_update['last_replier'] = latest_comment.get('commenter', '')
+    writes.append(('update', ticket_ref, ticket_update))
+    return writes
+
+
+def migrate_comments(page_size=100, dry_run=False, delete_embedded=False):
+    """
+    Runs the migration and returns (tickets_migrated, comments_moved).
+    """
+    tickets_migrated = 0
+    comments_moved = 0
+    batch = app.db.batch()
+    batch_writes = 0
+
+    def commit_batch():
+        nonlocal batch, batch_writes
+        if batch_writes and not dry_run:
+            batch.commit()
+        batch = app.db.batch()
+        batch_writes = 0
+
+    for ticket_ref, ticket_data in iter_tickets_with_comments(page_size, delete_embedded):
+        writes = ticket_migration_writes(ticket_ref, ticket_data, delete_embedded)
+        # Keep a ticket's writes together so its update lands with its comments
+        if batch_writes + len(writes) > MAX_BATCH_WRITES:
+            commit_batch()
+        for kind, reference, data in writes:
+            if kind == 'set':
+                batch.set(reference, data)
+            else:
+                batch.update(reference, data)
+            batch_writes += 1
+            # Very long threads do not fit in one batch; the deterministic comment
+            # IDs make a re-run after a partial failure overwrite rather than duplicate.
+            if batch_writes == MAX_BATCH_WRITES:
+                commit_batch()
+
+        tickets_migrated += 1
+        comments_moved += len(writes) - 1
+        print(f"{'Would migrate' if dry_run else 'Migrated'} {len(writes) - 1} comments for ticket {ticket_ref.id}")
+
+    commit_batch()
+    return tickets_migrated, comments_moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=100, help='tickets read per query page')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be migrated without writing')
+    parser.add_argument('--delete-embedded', action='store_true',
+                        help="remove the 'comments' arrays (only once the Node backend and React UI read the subcollection)")
+    args = parser.parse_args()
+
+    if not app.db_connected:
+        raise SystemExit("Database connection not established.")
+
+    tickets_migrated, comments_moved = migrate_comments(args.page_size, args.dry_run, args.delete_embedded)
+    print(f"Done: {comments_moved} comments from {tickets_migrated} tickets.")
+
+
+if __name__ == '__main__':
+    main()